@@ -1,18 +1,27 @@
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, request, jsonify, send_from_directory, Response, stream_with_context
 import requests
 import json
 import os
 from dotenv import load_dotenv
 import markdown
 import urllib.parse
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait
 from utils.codebase_analyzer import (
     get_enhanced_codebase_map_and_perspectives,
     generate_detailed_perspective_analysis_report,
     consolidate_analysis_report
 )
 from utils.gemini_client import get_gemini_client
+from utils.llm_cache import cached_generate, get_cached_response, store_response
+from utils import http_client
+from utils.doc_index import search_docs
+from utils.cache import LRUCache
+from utils.repo_scanner import scan_repository
 
-from utils.feedback_learner import FeedbackLearner
+from utils.feedback_learner import get_feedback_learner
+from utils.job_queue import no_progress
+from .jobs import enqueue_job
 
 # Load environment variables
 load_dotenv()
@@ -21,14 +30,34 @@ load_dotenv()
 code_analysis = Blueprint('code_analysis', __name__)
 
 # Initialize feedback learner
-feedback_learner = FeedbackLearner()
+feedback_learner = get_feedback_learner()
 
 # Get API key from environment variable
 API_KEY = os.getenv("GEMINI_API_KEY")
 if not API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set")
 
-URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
+MODEL_NAME = "gemini-2.0-flash"
+URL = f"https://generativelanguage.googleapis.com/v1beta/models/{MODEL_NAME}:generateContent?key={API_KEY}"
+STREAM_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{MODEL_NAME}:streamGenerateContent?alt=sse&key={API_KEY}"
+
+# Streamed chunks between full HTML renders; other chunk events carry only the new text
+STREAM_RENDER_EVERY = int(os.getenv("STREAM_RENDER_EVERY", "10"))
+
+# Seconds retrieve_external_docs waits for all retrieval backends together
+RETRIEVAL_DEADLINE = float(os.getenv("RETRIEVAL_DEADLINE", "5"))
+
+# Seconds live retrieval results are reused; empty results and failures expire sooner
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+RETRIEVAL_NEGATIVE_TTL = float(os.getenv("RETRIEVAL_NEGATIVE_TTL", "300"))
+retrieval_cache = LRUCache(max_entries=int(os.getenv("RETRIEVAL_CACHE_ENTRIES", "1024")))
+
+# Number of local knowledge base snippets added to a RAG prompt
+LOCAL_RETRIEVAL_TOP_K = int(os.getenv("LOCAL_RETRIEVAL_TOP_K", "3"))
+
+# Live functions queried for RAG context when the local index has nothing, in priority order
+RETRIEVAL_BACKENDS = []
+retrieval_executor = ThreadPoolExecutor(max_workers=int(os.getenv("RETRIEVAL_MAX_WORKERS", "8")))
 
 ROLE_INSTRUCTIONS = {
     "frontend": (
@@ -50,6 +79,40 @@ def extract_query(summary_text: str) -> str:
     """Pick the first 5 words from the summary as a search query."""
     words = summary_text.split()
     return " ".join(words[:5]) if len(words) >= 5 else summary_text
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def memoize_retrieval(backend):
+    """
+    Cache a retrieval backend's results per normalized query. Empty results and
+    failures are cached too, for the shorter RETRIEVAL_NEGATIVE_TTL.
+    """
+    @functools.wraps(backend)
+    def wrapper(query: str) -> str:
+        key = f"{backend.__name__}:{normalize_query(query)}"
+        cached = retrieval_cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            text = backend(query)
+        except Exception as e:
+            print(f"Error in retrieval backend {backend.__name__}: {str(e)}")
+            text = ""
+        retrieval_cache.set(key, text, ttl=RETRIEVAL_CACHE_TTL if text else RETRIEVAL_NEGATIVE_TTL)
+        return text
+    return wrapper
+
+def register_retrieval_backend(backend):
+    """
+    Register a function that maps a query to context text ("" if it has nothing).
+    Backends are queried concurrently; their results are combined in registration order.
+    """
+    RETRIEVAL_BACKENDS.append(backend)
+    return backend
+
+@register_retrieval_backend
+@memoize_retrieval
 def retrieve_stackoverflow_docs(query: str) -> str:
     # URL encode query
     q = urllib.parse.quote(query)
@@ -58,7 +121,7 @@ def retrieve_stackoverflow_docs(query: str) -> str:
         f"order=desc&sort=relevance&q={q}&site=stackoverflow&pagesize=3&filter=!9_bDDxJY5"
     )
     try:
-        r = requests.get(url, timeout=5)
+        r = http_client.get(url, timeout=5)
         r.raise_for_status()
         items = r.json().get('items', [])
         if not items:
@@ -73,27 +136,63 @@ def retrieve_stackoverflow_docs(query: str) -> str:
         return "\n\n".join(snippets)
     except Exception:
         return ""
-def retrieve_external_docs(query: str) -> str:
-    # Retrieve from Wikipedia as fallback
-    wiki_text = retrieve_wikipedia_docs(query)
-
-    # Retrieve from Stack Overflow
-    so_text = retrieve_stackoverflow_docs(query)
-
-    # Combine both with prioritization or simple concatenation
-    combined_text = "\n\n---\n\n".join(filter(None, [so_text, wiki_text]))
-    return combined_text
+def retrieve_local_docs(query: str) -> str:
+    """Look up best-practice snippets in the local knowledge base index."""
+    try:
+        results = search_docs(query, k=LOCAL_RETRIEVAL_TOP_K)
+    except Exception as e:
+        print(f"Error searching local docs: {str(e)}")
+        return ""
+    return "\n\n".join(f"{result['title']}\n{result['text']}" for result in results)
 
+def retrieve_external_docs(query: str) -> str:
+    """
+    Look the query up in the local index first. Only if nothing relevant is found,
+    query every live retrieval backend at once and combine whatever returns before the deadline.
+    """
+    local_text = retrieve_local_docs(query)
+    if local_text:
+        return local_text
+
+    futures = [retrieval_executor.submit(backend, query) for backend in RETRIEVAL_BACKENDS]
+    done, _ = wait(futures, timeout=RETRIEVAL_DEADLINE)
+
+    # Keep registration order, skipping backends that failed or missed the deadline
+    texts = [
+        future.result() for future in futures
+        if future in done and future.exception() is None
+    ]
+    return "\n\n---\n\n".join(filter(None, texts))
+
+@register_retrieval_backend
+@memoize_retrieval
 def retrieve_wikipedia_docs(query: str) -> str:
     title = urllib.parse.quote(query.title())
     wiki_url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{title}"
     try:
-        r = requests.get(wiki_url, timeout=5)
+        r = http_client.get(wiki_url, timeout=5)
         r.raise_for_status()
         return r.json().get("extract", "")
     except Exception:
         return ""
 
+def post_to_gemini(prompt: str) -> str:
+    """Send a single prompt to Gemini and return the text of the first candidate."""
+    payload = {
+        "contents": [
+            {"role": "user", "parts": [{"text": prompt}]}
+        ]
+    }
+    response = http_client.post(
+        URL,
+        headers={"Content-Type": "application/json"},
+        data=json.dumps(payload),
+        timeout=30
+    )
+    response.raise_for_status()
+    reply = response.json()
+    return reply['candidates'][0]['content']['parts'][0]['text']
+
 def apply_rag(summary_md: str) -> str:
     """
     Given the initial Markdown summary, retrieve external docs 
@@ -111,65 +210,46 @@ def apply_rag(summary_md: str) -> str:
         f"{external}\n\n"
         "### Enhanced Summary:"
     )
-    payload = {
-        "contents": [
-            {"role": "user", "parts": [{"text": rag_prompt}]}
-        ]
-    }
-    resp = requests.post(
-        URL,
-        headers={"Content-Type": "application/json"},
-        data=json.dumps(payload),
-        timeout=30
-    )
     try:
-        resp.raise_for_status()
-        reply = resp.json()
-        return reply['candidates'][0]['content']['parts'][0]['text']
+        return cached_generate(MODEL_NAME, rag_prompt, post_to_gemini)
     except Exception:
         # Fall back to the original summary if RAG fails
         return summary_md
 
-def call_gemini_api(role: str, user_input: str, use_rag: bool = False) -> str:
-    """
-    Call Gemini for an initial summary, then optionally
-    pass that summary through the RAG layer if use_rag is True.
-    """
+def build_analysis_prompt(role: str, user_input: str) -> str:
+    """Combine the role instructions, feedback-driven adjustments and the user's input."""
     base_instructions = ROLE_INSTRUCTIONS[role]
     improved_instructions = feedback_learner.update_instructions(base_instructions, role)
 
-    full_prompt = (
+    return (
         improved_instructions
         + " Please format your response using Markdown. "
         + "Use **bold**, # headings, bullet points, and emojis where appropriate.\n\n"
         + user_input
     )
-    payload = {
-        "contents": [
-            {"role": "user", "parts": [{"text": full_prompt}]}
-        ]
-    }
+
+def render_markdown(markdown_text: str) -> str:
+    """Convert Markdown to HTML."""
+    return markdown.markdown(
+        markdown_text,
+        extensions=['fenced_code', 'codehilite', 'nl2br']
+    )
+
+def call_gemini_api(role: str, user_input: str, use_rag: bool = False) -> str:
+    """
+    Call Gemini for an initial summary, then optionally
+    pass that summary through the RAG layer if use_rag is True.
+    """
+    full_prompt = build_analysis_prompt(role, user_input)
 
     try:
-        response = requests.post(
-            URL,
-            headers={"Content-Type": "application/json"},
-            data=json.dumps(payload),
-            timeout=30
-        )
-        response.raise_for_status()
-        reply = response.json()
-        raw_markdown = reply['candidates'][0]['content']['parts'][0]['text']
+        raw_markdown = cached_generate(MODEL_NAME, full_prompt, post_to_gemini)
 
         # If RAG requested, apply enhancement
         final_markdown = apply_rag(raw_markdown) if use_rag else raw_markdown
 
         # Convert final Markdown to HTML
-        html_response = markdown.markdown(
-            final_markdown,
-            extensions=['fenced_code', 'codehilite', 'nl2br']
-        )
-        return html_response
+        return render_markdown(final_markdown)
 
     except requests.exceptions.Timeout:
         return "Error: Request timed out. Please try again."
@@ -178,6 +258,77 @@ def call_gemini_api(role: str, user_input: str, use_rag: bool = False) -> str:
     except (KeyError, json.JSONDecodeError) as e:
         return f"Error processing response: {str(e)}"
 
+def stream_from_gemini(prompt: str):
+    """Yield text chunks from Gemini's streaming endpoint as they arrive."""
+    payload = {
+        "contents": [
+            {"role": "user", "parts": [{"text": prompt}]}
+        ]
+    }
+    response = http_client.post(
+        STREAM_URL,
+        headers={"Content-Type": "application/json"},
+        data=json.dumps(payload),
+        stream=True,
+        timeout=30
+    )
+    with response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            reply = json.loads(line[len("data:"):])
+            for candidate in reply.get('candidates', [])[:1]:
+                for part in candidate.get('content', {}).get('parts', []):
+                    if part.get('text'):
+                        yield part['text']
+
+def sse_event(event: dict) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+def stream_gemini_api(role: str, user_input: str, use_rag: bool = False):
+    """
+    Stream the analysis as server-sent events. Each "chunk" event carries the new text;
+    only every STREAM_RENDER_EVERY-th also carries the HTML rendering of everything so
+    far, so the payload does not grow with the square of the response length. A final
+    "done" event carries the complete HTML, after the RAG pass if requested.
+    """
+    full_prompt = build_analysis_prompt(role, user_input)
+
+    try:
+        raw_markdown = get_cached_response(MODEL_NAME, full_prompt)
+        if raw_markdown is not None:
+            yield sse_event({"type": "chunk", "delta": raw_markdown, "html": render_markdown(raw_markdown)})
+        else:
+            chunks = []
+            for chunk in stream_from_gemini(full_prompt):
+                chunks.append(chunk)
+                event = {"type": "chunk", "delta": chunk}
+                # Render the first chunk for a quick first paint, then every STREAM_RENDER_EVERY
+                if (len(chunks) - 1) % max(STREAM_RENDER_EVERY, 1) == 0:
+                    event["html"] = render_markdown("".join(chunks))
+                yield sse_event(event)
+            raw_markdown = "".join(chunks)
+            store_response(MODEL_NAME, full_prompt, raw_markdown)
+
+        final_markdown = raw_markdown
+        if use_rag:
+            yield sse_event({"type": "status", "message": "Enhancing the analysis with external context"})
+            final_markdown = apply_rag(raw_markdown)
+
+        yield sse_event({"type": "done", "html": render_markdown(final_markdown)})
+
+    except requests.exceptions.Timeout:
+        yield sse_event({"type": "error", "error": "Request timed out. Please try again."})
+    except requests.exceptions.RequestException as e:
+        yield sse_event({"type": "error", "error": str(e)})
+    except (KeyError, json.JSONDecodeError) as e:
+        yield sse_event({"type": "error", "error": f"Error processing response: {str(e)}"})
+    except Exception as e:
+        # Anything else would end the stream without telling the client why
+        print(f"Error streaming analysis: {str(e)}")
+        yield sse_event({"type": "error", "error": f"Unexpected error: {str(e)}"})
+
 @code_analysis.route('/')
 def index():
     return send_from_directory('templates', 'analyze.html')
@@ -199,6 +350,13 @@ def analyze():
     if not user_input:
         return jsonify({"error": "Empty input"}), 400
 
+    if data.get('stream'):
+        return Response(
+            stream_with_context(stream_gemini_api(role, user_input, use_rag)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
     result_html = call_gemini_api(role, user_input, use_rag)
     print("Result HTML:", result_html)
     return jsonify({"response": result_html})
@@ -227,43 +385,72 @@ def submit_feedback():
     )
     return jsonify({"message": "Feedback saved successfully"})
 
-@code_analysis.route('/analyze', methods=['POST'])
-def analyze_codebase():
+def run_codebase_analysis(repo_path: str, progress=no_progress):
+    """Analyze a local codebase perspective by perspective. Returns the response body and HTTP status code."""
     try:
-        # Get the repository path from the request
-        data = request.get_json()
-        repo_path = data.get('repo_path')
-        
-        if not repo_path or not os.path.exists(repo_path):
-            return jsonify({
-                'error': 'Invalid repository path'
-            }), 400
-
         # Initialize Gemini client
         gemini_client = get_gemini_client()
 
+        # Walk the codebase once and share the index between both steps
+        index = scan_repository(repo_path)
+
         # Step 1: Get initial codebase map and perspectives
+        progress("Identifying codebase perspectives", 10)
         codebase_perspectives_json = get_enhanced_codebase_map_and_perspectives(
             repo_path,
-            gemini_client
+            gemini_client,
+            index=index
         )
 
         # Step 2: Generate detailed analysis for each perspective
+        progress("Analyzing perspectives", 30)
         perspective_reports = generate_detailed_perspective_analysis_report(
             repo_path,
             codebase_perspectives_json,
-            gemini_client
+            gemini_client,
+            index=index
         )
 
         # Step 3: Consolidate the final report
+        progress("Consolidating report", 95)
         final_report = consolidate_analysis_report(
             codebase_perspectives_json,
             perspective_reports
         )
 
-        return jsonify(final_report)
+        return final_report, 200
 
     except Exception as e:
-        return jsonify({
+        return {
             'error': str(e)
-        }), 500
+        }, 500
+
+def codebase_analysis_job(params, progress):
+    return run_codebase_analysis(params['repo_path'], progress)
+
+@code_analysis.route('/analyze', methods=['POST'])
+def analyze_codebase():
+    # Get the repository path from the request
+    data = request.get_json()
+    repo_path = data.get('repo_path')
+    
+    if not repo_path or not os.path.exists(repo_path):
+        return jsonify({
+            'error': 'Invalid repository path'
+        }), 400
+
+    result, status = run_codebase_analysis(repo_path)
+    return jsonify(result), status
+
+@code_analysis.route('/analyze/jobs', methods=['POST'])
+def submit_codebase_analysis_job():
+    """Queue a codebase analysis in the background and return its job id."""
+    data = request.get_json()
+    repo_path = data.get('repo_path')
+
+    if not repo_path or not os.path.exists(repo_path):
+        return jsonify({
+            'error': 'Invalid repository path'
+        }), 400
+
+    return enqueue_job('codebase_analysis', {'repo_path': os.path.abspath(repo_path)}, codebase_analysis_job)
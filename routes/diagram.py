@@ -4,12 +4,12 @@ import os
 import base64
 import ast
 from sqlalchemy import create_engine, inspect
-from utils.feedback_learner import FeedbackLearner
+from utils.feedback_learner import get_feedback_learner
 from plantuml import PlantUML
 
 # Create blueprint
 diagram = Blueprint('diagram', __name__)
-feedback_learner = FeedbackLearner()
+feedback_learner = get_feedback_learner()
 
 @diagram.route('/')
 def diagram_page():
@@ -1,11 +1,11 @@
 from flask import Blueprint, request, jsonify
-from utils.feedback_learner import FeedbackLearner
+from utils.feedback_learner import get_feedback_learner
 
 # Create blueprint
 feedback = Blueprint('feedback', __name__)
 
 # Initialize feedback learner
-feedback_learner = FeedbackLearner()
+feedback_learner = get_feedback_learner()
 
 @feedback.route('/api/submit-feedback', methods=['POST'])
 def submit_feedback():
@@ -49,35 +49,22 @@ def submit_feedback():
 
 @feedback.route('/api/get-feedback-stats', methods=['GET'])
 def get_feedback_stats():
-    # Get feedback statistics from the feedback learner
+    # Get feedback statistics from the feedback learner, aggregated over all roles
     stats = {}
     for feedback_type in ['code_analysis', 'repo_analysis', 'diagram']:
-        improvements = feedback_learner.get_role_improvements(feedback_type)
-        if improvements:
-            stats[feedback_type] = {
-                'total_feedback': improvements.get('total_feedback', 0),
-                'average_rating': improvements.get('average_rating', 0),
-                'recent_feedback': improvements.get('recent_feedback', [])
-            }
-        else:
-            stats[feedback_type] = {
-                'total_feedback': 0,
-                'average_rating': 0,
-                'recent_feedback': []
-            }
+        stats[feedback_type] = feedback_learner.get_type_stats(feedback_type)
     
     return jsonify(stats)
 
+@feedback.route('/api/analytics', methods=['GET'])
+def get_feedback_analytics():
+    # Rating histograms, 1h/24h/7d rolling averages and trends per type and role
+    return jsonify(feedback_learner.get_analytics())
+
 @feedback.route('/api/clear-feedback', methods=['POST'])
 def clear_feedback():
     # This endpoint should be protected in production
-    feedback_learner = FeedbackLearner()
-    feedback_learner.feedback_data = {
-        'code_analysis': [],
-        'repo_analysis': [],
-        'diagram': []
-    }
-    feedback_learner.save_feedback('code_analysis', 0, '', {})
+    feedback_learner.clear()
     return jsonify({
         'message': 'All feedback data cleared',
         'status': 'success'
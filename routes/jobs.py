@@ -0,0 +1,67 @@
+from flask import Blueprint, jsonify, request, Response, stream_with_context, url_for
+import json
+import os
+import time
+from utils.job_queue import get_job_queue, JobQueueFull, FINISHED_STATUSES
+
+# Create blueprint
+jobs = Blueprint('jobs', __name__)
+
+# Seconds between progress checks when streaming job events
+EVENT_POLL_INTERVAL = 1.0
+# Seconds one events response stays open, kept well below the gunicorn worker timeout.
+# Clients reconnect with Last-Event-ID (EventSource does so itself) or poll the job.
+EVENT_STREAM_MAX_SECONDS = float(os.getenv("EVENT_STREAM_MAX_SECONDS", "20"))
+# Milliseconds an EventSource waits before reconnecting after a response ends
+EVENT_RETRY_MS = 1000
+
+def enqueue_job(kind, params, func):
+    """Submit a background job and return the 202 response pointing at its status."""
+    try:
+        job_id, created = get_job_queue().submit(kind, params, func)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({
+        "job_id": job_id,
+        "deduplicated": not created,
+        "status_url": url_for('jobs.get_job', job_id=job_id),
+        "events_url": url_for('jobs.stream_job_events', job_id=job_id)
+    }), 202
+
+@jobs.route('/api/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
+
+@jobs.route('/api/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    if get_job_queue().get(job_id) is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+
+    # A reconnecting client already has the state it last received
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    def events():
+        last_sent = last_event_id
+        deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+        yield f"retry: {EVENT_RETRY_MS}\n\n"
+        while True:
+            job = get_job_queue().get(job_id)
+            if job is None:
+                return
+            event_id = f"{job['updated_at']}:{job['status']}"
+            if event_id != last_sent:
+                yield f"id: {event_id}\ndata: {json.dumps(job)}\n\n"
+                last_sent = event_id
+            if job["status"] in FINISHED_STATUSES or time.monotonic() >= deadline:
+                return
+            time.sleep(EVENT_POLL_INTERVAL)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -9,7 +9,20 @@ from .role_analysis import (
     get_initial_codebase_overview,
     generate_multi_role_summary_report
 )
-from utils.feedback_learner import FeedbackLearner
+from .jobs import enqueue_job
+from utils.job_queue import no_progress
+from utils.feedback_learner import get_feedback_learner
+from utils.llm_cache import cached_generate
+from utils import http_client
+from utils.language_stats import compute_language_stats
+from utils.repo_scanner import scan_repository
+from utils.repo_mirror import checkout_worktree, release_worktree
+from utils.repo_cache import (
+    get_remote_head_sha,
+    get_local_head_sha,
+    get_cached_report,
+    store_report
+)
 
 # Load environment variables
 load_dotenv()
@@ -18,12 +31,31 @@ load_dotenv()
 repo_analysis = Blueprint('repo_analysis', __name__)
 
 # Initialize feedback learner
-feedback_learner = FeedbackLearner()
+feedback_learner = get_feedback_learner()
 
 # Get API keys from environment variables
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Seconds to wait for a Gemini response
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "120"))
+
+# How repositories are cloned: "full" history, "shallow" (depth 1), "sparse"
+# (depth 1, blobs fetched only for paths matching SPARSE_CHECKOUT_PATTERNS) or
+# "mirror" (a sparse worktree checked out from a persistent local mirror)
+CLONE_MODES = ("full", "shallow", "sparse", "mirror")
+CLONE_MODE = os.getenv("CLONE_MODE", "mirror")
+# Repositories larger than this, as reported by GitHub, are rejected before cloning
+MAX_REPO_SIZE_KB = int(os.getenv("MAX_REPO_SIZE_KB", str(500 * 1024)))
+# Paths the analyzers never read: dependencies, build output and binary assets
+SPARSE_CHECKOUT_PATTERNS = [
+    "/*",
+    "!node_modules/", "!bower_components/", "!vendor/", "!dist/", "!build/", "!coverage/",
+    "!*.png", "!*.jpg", "!*.jpeg", "!*.gif", "!*.ico", "!*.webp", "!*.bmp",
+    "!*.mp3", "!*.mp4", "!*.mov", "!*.avi", "!*.woff", "!*.woff2", "!*.ttf", "!*.eot", "!*.otf",
+    "!*.zip", "!*.tar", "!*.gz", "!*.jar", "!*.exe", "!*.dll", "!*.so", "!*.dylib", "!*.bin",
+    "!*.pdf", "!*.psd", "!*.parquet", "!*.pkl", "!*.h5", "!*.onnx", "!*.pt"
+]
 
 def get_github_headers():
     headers = {'Accept': 'application/vnd.github.v3+json'}
@@ -31,60 +63,158 @@ def get_github_headers():
         headers['Authorization'] = f'token {GITHUB_TOKEN}'
     return headers
 
-def get_repo_contents(owner, repo, path=''):
-    url = f'https://api.github.com/repos/{owner}/{repo}/contents/{path}'
-    response = requests.get(url, headers=get_github_headers())
-    response.raise_for_status()
-    return response.json()
+def get_local_tree(repo_path: str) -> List[Dict]:
+    """Lists every file and directory of the checked-out commit, including paths outside a sparse checkout."""
+    import subprocess
 
-def get_repo_languages(owner, repo):
-    url = f'https://api.github.com/repos/{owner}/{repo}/languages'
-    response = requests.get(url, headers=get_github_headers())
+    result = subprocess.run(
+        ["git", "-C", repo_path, "ls-tree", "-r", "-t", "-z", "HEAD"],
+        check=True,
+        capture_output=True
+    )
+    tree = []
+    for record in result.stdout.decode("utf-8", errors="replace").split("\0"):
+        if not record:
+            continue
+        meta, path = record.split("\t", 1)
+        tree.append({"path": path, "type": meta.split()[1]})
+    return tree
+
+def get_remote_tree(owner: str, repo: str) -> List[Dict]:
+    """Lists every file and directory of the default branch with a single recursive trees API call."""
+    url = f'https://api.github.com/repos/{owner}/{repo}/git/trees/HEAD?recursive=1'
+    response = http_client.get(url, headers=get_github_headers(), timeout=30)
     response.raise_for_status()
-    return response.json()
+    data = response.json()
+    if data.get('truncated'):
+        print(f"Tree listing for {owner}/{repo} was truncated by the GitHub API")
+    return data.get('tree', [])
+
+def get_repo_tree(owner: str, repo: str, repo_path: Optional[str] = None) -> List[Dict]:
+    """Lists the repository tree from the local clone, falling back to the GitHub API."""
+    if repo_path:
+        try:
+            return get_local_tree(repo_path)
+        except Exception as e:
+            print(f"Error listing local tree: {str(e)}")
+    return get_remote_tree(owner, repo)
+
+def format_directory_structure(tree: List[Dict]) -> List[str]:
+    """Renders a flat tree listing as an indented, emoji-prefixed directory structure."""
+    children = {}
+    for item in tree:
+        parent = os.path.dirname(item['path'])
+        children.setdefault(parent, []).append(item)
 
-def format_directory_structure(contents, prefix='', owner=None, repo=None):
     structure = []
-    for item in contents:
-        if item['type'] == 'dir':
-            structure.append(f"{prefix}📁 {item['name']}/")
-            try:
-                sub_contents = get_repo_contents(owner, repo, item['path'])
-                structure.extend(format_directory_structure(sub_contents, prefix + '  ', owner, repo))
-            except Exception as e:
-                structure.append(f"{prefix}  (Error accessing directory: {str(e)})")
-        else:
-            structure.append(f"{prefix}📄 {item['name']}")
+
+    def render(directory, prefix):
+        for item in children.get(directory, []):
+            name = os.path.basename(item['path'])
+            if item['type'] == 'tree':
+                structure.append(f"{prefix}📁 {name}/")
+                render(item['path'], prefix + '  ')
+            else:
+                structure.append(f"{prefix}📄 {name}")
+
+    render('', '')
     return structure
 
-def clone_repository(owner: str, repo: str) -> Optional[str]:
+class RepositoryTooLargeError(Exception):
+    """Raised when a repository exceeds MAX_REPO_SIZE_KB and is not cloned."""
+
+def get_repo_size_kb(owner: str, repo: str) -> Optional[int]:
+    """Returns the repository size reported by GitHub in KB, or None if it is unavailable."""
+    url = f'https://api.github.com/repos/{owner}/{repo}'
+    try:
+        response = http_client.get(url, headers=get_github_headers(), timeout=10)
+        response.raise_for_status()
+        return response.json().get('size')
+    except Exception as e:
+        print(f"Error fetching repository size: {str(e)}")
+        return None
+
+def build_clone_commands(repo_url: str, target_dir: str, mode: str) -> List[List[str]]:
+    """Returns the git commands that clone repo_url into target_dir for the given clone mode."""
+    if mode == "full":
+        return [["git", "clone", repo_url, target_dir]]
+
+    # Only the working tree is analyzed, so history and tags are never needed
+    shallow_clone = ["git", "clone", "--depth", "1", "--single-branch", "--no-tags"]
+    if mode == "shallow":
+        return [shallow_clone + [repo_url, target_dir]]
+
+    # Sparse: fetch trees up front and only the blobs matching the checkout patterns
+    return [
+        shallow_clone + ["--filter=blob:none", "--no-checkout", repo_url, target_dir],
+        ["git", "-C", target_dir, "sparse-checkout", "set", "--no-cone", *SPARSE_CHECKOUT_PATTERNS],
+        ["git", "-C", target_dir, "checkout"]
+    ]
+
+def clone_repository(owner: str, repo: str, mode: Optional[str] = None) -> Optional[str]:
     """Clone the repository to a temporary directory."""
     import tempfile
     import subprocess
+    import shutil
+
+    mode = mode or CLONE_MODE
+    if mode not in CLONE_MODES:
+        raise ValueError(f"Invalid clone mode '{mode}'. Must be one of {list(CLONE_MODES)}.")
+
+    # Reject oversized repositories before transferring anything
+    size_kb = get_repo_size_kb(owner, repo)
+    if size_kb is not None and size_kb > MAX_REPO_SIZE_KB:
+        raise RepositoryTooLargeError(
+            f"Repository {owner}/{repo} is {size_kb} KB, which exceeds the {MAX_REPO_SIZE_KB} KB limit"
+        )
     
+    repo_url = f"https://github.com/{owner}/{repo}.git"
+
+    if mode == "mirror":
+        try:
+            return checkout_worktree(owner, repo, repo_url, SPARSE_CHECKOUT_PATTERNS)
+        except subprocess.CalledProcessError as e:
+            print(f"Error cloning repository: {e.stderr.decode()}")
+            return None
+        except ValueError as e:
+            print(f"Error cloning repository: {str(e)}")
+            return None
+
     # Create a temporary directory
     temp_dir = tempfile.mkdtemp()
-    repo_url = f"https://github.com/{owner}/{repo}.git"
     
     try:
         # Clone the repository
-        subprocess.run(
-            ["git", "clone", repo_url, temp_dir],
-            check=True,
-            capture_output=True
-        )
+        for command in build_clone_commands(repo_url, temp_dir, mode):
+            subprocess.run(
+                command,
+                check=True,
+                capture_output=True,
+                env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+            )
         return temp_dir
     except subprocess.CalledProcessError as e:
         print(f"Error cloning repository: {e.stderr.decode()}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
         return None
 
+def release_repository(repo_path: str) -> None:
+    """Remove a checkout returned by clone_repository."""
+    release_worktree(repo_path)
+
 class GeminiClient:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, timeout: float = GEMINI_TIMEOUT):
         self.api_key = api_key
-        self.api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+        self.timeout = timeout
+        self.model = "gemini-2.0-flash"
+        self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
     
     def generate_text_from_gemini(self, prompt: str) -> str:
-        """Generate text using Gemini API."""
+        """Generate text using Gemini API, reusing cached responses for identical prompts."""
+        return cached_generate(self.model, prompt, self._post_prompt)
+
+    def _post_prompt(self, prompt: str) -> str:
+        """Send the prompt to the Gemini API."""
         headers = {
             'Content-Type': 'application/json',
         }
@@ -98,10 +228,11 @@ class GeminiClient:
         }
         
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.api_url}?key={self.api_key}",
                 headers=headers,
-                json=payload
+                json=payload,
+                timeout=self.timeout
             )
             response.raise_for_status()
             
@@ -110,72 +241,121 @@ class GeminiClient:
             print(f"Error calling Gemini API: {str(e)}")
             raise
 
+def is_complete_report(report: Dict) -> bool:
+    """Returns True if no part of the report failed, so it is safe to cache."""
+    if "error" in report["overview"]:
+        return False
+    return not any(
+        isinstance(summary, dict) and "error" in summary
+        for summary in report["role_summaries"].values()
+    )
+
 @repo_analysis.route('/')
 def repo_analyzer():
     return send_from_directory('templates', 'repo_analyzer.html')
 
-@repo_analysis.route('/api/analyze-repo', methods=['POST'])
-def analyze_repo():
-    """Main endpoint for repository analysis."""
-    data = request.json
-    owner = data.get('owner')
-    repo = data.get('repo')
-
-    if not owner or not repo:
-        return jsonify({"error": "Missing owner or repository name"}), 400
+def run_repo_analysis(owner: str, repo: str, force_refresh: bool = False, progress=no_progress):
+    """Analyze a GitHub repository. Returns the response body and HTTP status code."""
+    # Serve the stored report if the repository has not changed since the last analysis
+    progress("Checking for a stored report", 2)
+    head_sha = get_remote_head_sha(owner, repo)
+    if not force_refresh:
+        cached_report = get_cached_report(owner, repo, head_sha)
+        if cached_report is not None:
+            return cached_report, 200
 
     try:
         # Clone the repository
-        repo_path = clone_repository(owner, repo)
+        progress("Cloning repository", 5)
+        try:
+            repo_path = clone_repository(owner, repo)
+        except RepositoryTooLargeError as e:
+            return {"error": str(e)}, 413
         if not repo_path:
-            return jsonify({"error": "Failed to clone repository"}), 500
+            return {"error": "Failed to clone repository"}, 500
 
         try:
+            commit_sha = get_local_head_sha(repo_path) or head_sha
+
             # Initialize Gemini client
             gemini_client = GeminiClient(API_KEY)
+
+            # Walk the checkout once; every step below reads from this index
+            index = scan_repository(repo_path)
             
             # Get initial codebase overview
-            overview_json = get_initial_codebase_overview(repo_path, gemini_client)
+            progress("Building codebase overview", 20)
+            overview_json = get_initial_codebase_overview(repo_path, gemini_client, index=index)
             
             # Generate role-specific summaries
-            role_summaries = generate_multi_role_summary_report(repo_path, overview_json, gemini_client)
+            progress("Generating role summaries", 40)
+            role_summaries = generate_multi_role_summary_report(repo_path, overview_json, gemini_client, index=index)
             
             # Get repository contents and structure
-            contents = get_repo_contents(owner, repo)
-            structure = format_directory_structure(contents, owner=owner, repo=repo)
+            progress("Collecting structure and language statistics", 90)
+            tree = get_repo_tree(owner, repo, repo_path)
+            structure = format_directory_structure(tree)
             
-            # Get language statistics
-            languages = get_repo_languages(owner, repo)
-            if not languages:
-                return jsonify({"error": "No language data available for this repository"}), 404
-                
-            total_bytes = sum(languages.values())
-            languages = {lang: (bytes/total_bytes)*100 for lang, bytes in languages.items()}
+            # Get language statistics from the checkout
+            languages = compute_language_stats(repo_path, commit_sha, index=index)
 
             # Prepare final response
             response = {
                 "structure": "\n".join(structure),
                 "languages": languages,
                 "overview": overview_json,
-                "role_summaries": role_summaries["role_summaries"]
+                "role_summaries": role_summaries["role_summaries"],
+                "commit_sha": commit_sha
             }
+
+            if is_complete_report(response):
+                store_report(owner, repo, response["commit_sha"], response)
             
-            return jsonify(response)
+            return response, 200
             
         finally:
             # Clean up: remove the cloned repository
-            import shutil
-            shutil.rmtree(repo_path, ignore_errors=True)
+            release_repository(repo_path)
             
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
-            return jsonify({"error": f"Repository not found: {owner}/{repo}"}), 404
+            return {"error": f"Repository not found: {owner}/{repo}"}, 404
         elif e.response.status_code == 403:
-            return jsonify({"error": "Rate limit exceeded. Please try again later or use a GitHub token."}), 403
+            return {"error": "Rate limit exceeded. Please try again later or use a GitHub token."}, 403
         else:
-            return jsonify({"error": f"GitHub API error: {str(e)}"}), e.response.status_code
+            return {"error": f"GitHub API error: {str(e)}"}, e.response.status_code
     except Exception as e:
-        return jsonify({"error": f"Error analyzing repository: {str(e)}"}), 500 
+        return {"error": f"Error analyzing repository: {str(e)}"}, 500
+
+def repo_analysis_job(params: Dict, progress):
+    return run_repo_analysis(params["owner"], params["repo"], params["force_refresh"], progress)
+
+@repo_analysis.route('/api/analyze-repo', methods=['POST'])
+def analyze_repo():
+    """Main endpoint for repository analysis."""
+    data = request.json
+    owner = data.get('owner')
+    repo = data.get('repo')
+    force_refresh = bool(data.get('force_refresh', False))
+
+    if not owner or not repo:
+        return jsonify({"error": "Missing owner or repository name"}), 400
+
+    result, status = run_repo_analysis(owner, repo, force_refresh)
+    return jsonify(result), status
+
+@repo_analysis.route('/api/analyze-repo/jobs', methods=['POST'])
+def submit_repo_analysis_job():
+    """Queue a repository analysis in the background and return its job id."""
+    data = request.json
+    owner = data.get('owner')
+    repo = data.get('repo')
+
+    if not owner or not repo:
+        return jsonify({"error": "Missing owner or repository name"}), 400
+
+    params = {"owner": owner, "repo": repo, "force_refresh": bool(data.get('force_refresh', False))}
+    return enqueue_job('repo_analysis', params, repo_analysis_job)
 
 @repo_analysis.route('/api/feedback', methods=['POST'])
 def submit_feedback():
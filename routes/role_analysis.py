@@ -1,21 +1,31 @@
 import os
 import json
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import requests
 from pathlib import Path
 import logging
+from utils.concurrency import run_concurrently
+from utils.context_packer import pack_files
+from utils.code_skeleton import read_condensed
+from utils.repo_scanner import FileEntry, RepoIndex, scan_repository
+from utils.analysis_cache import get_cached_analysis, make_analysis_key, store_analysis
+from utils.path_filters import TraversalRules
 
-def get_initial_codebase_overview(repo_path: str, gemini_client) -> Dict:
+# Maximum number of role analyses sent to Gemini at the same time
+ROLE_ANALYSIS_MAX_WORKERS = int(os.getenv("ROLE_ANALYSIS_MAX_WORKERS", "4"))
+# Seconds a single role analysis may run before it is reported as failed
+ROLE_ANALYSIS_TIMEOUT = float(os.getenv("ROLE_ANALYSIS_TIMEOUT", "180"))
+# Bytes read from any single file selected for a role
+ROLE_FILE_MAX_BYTES = int(os.getenv("ROLE_FILE_MAX_BYTES", "20000"))
+# Bytes of file content selected for a role in total
+ROLE_TOTAL_MAX_BYTES = int(os.getenv("ROLE_TOTAL_MAX_BYTES", "200000"))
+
+def get_initial_codebase_overview(repo_path: str, gemini_client, index: Optional[RepoIndex] = None) -> Dict:
     """Get initial overview of the codebase using Gemini."""
+    index = index or scan_repository(repo_path)
+
     # Get directory structure
-    structure = []
-    for root, dirs, files in os.walk(repo_path):
-        level = root.replace(repo_path, '').count(os.sep)
-        indent = ' ' * 4 * level
-        structure.append(f"{indent}{os.path.basename(root)}/")
-        sub_indent = ' ' * 4 * (level + 1)
-        for f in files:
-            structure.append(f"{sub_indent}{f}")
+    structure = index.tree_lines()
     
     # Read key configuration files
     config_files = {
@@ -33,17 +43,13 @@ def get_initial_codebase_overview(repo_path: str, gemini_client) -> Dict:
     
     file_contents = {}
     for filename, description in config_files.items():
-        file_path = os.path.join(repo_path, filename)
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    file_contents[filename] = {
-                        'content': content,
-                        'description': description
-                    }
-            except Exception as e:
-                print(f"Error reading {filename}: {str(e)}")
+        entry = index.get(filename)
+        content = entry.read() if entry else None
+        if content is not None:
+            file_contents[filename] = {
+                'content': content,
+                'description': description
+            }
     
     # Prepare prompt for Gemini
     prompt = f"""Analyze this codebase structure and configuration files to provide a comprehensive overview:
@@ -106,26 +112,33 @@ Focus on providing accurate, well-reasoned insights based on the available infor
             "details": str(e)
         }
 
-def select_relevant_files(repo_path: str, overview_json: Dict, role: str) -> List[Dict]:
+def select_relevant_files(repo_path: str, overview_json: Dict, role: str, index: Optional[RepoIndex] = None) -> List[Dict]:
     """Select relevant files based on role and overview."""
-    relevant_files = []
+    index = index or scan_repository(repo_path)
+    return load_relevant_files(select_candidate_files(index, overview_json, role))
+
+def select_candidate_files(index: RepoIndex, overview_json: Dict, role: str) -> List[Tuple[FileEntry, str]]:
+    """Pick the (entry, type) pairs relevant to a role from index metadata alone, without reading any file."""
     
     # Map roles to directory types and file patterns
     role_patterns = {
         "frontend": {
             "dir_types": ["frontend", "client", "web", "ui", "src", "app", "components", "pages", "views", "public", "static"],
-            "file_patterns": [".js", ".jsx", ".ts", ".tsx", ".vue", ".html", ".css", ".scss", ".sass", ".less", ".styl", ".json", ".svg", ".png", ".jpg", ".gif"],
-            "config_files": ["package.json", "webpack.config.js", "vite.config.js", "next.config.js", "angular.json", "tsconfig.json"]
+            "file_patterns": [".js", ".jsx", ".ts", ".tsx", ".vue", ".html", ".css", ".scss", ".sass", ".less", ".styl", ".json", ".svg"],
+            "config_files": ["package.json", "webpack.config.js", "vite.config.js", "next.config.js", "angular.json", "tsconfig.json"],
+            "exclude_dirs": ["migrations", "fixtures", "__snapshots__", "e2e"]
         },
         "backend": {
             "dir_types": ["backend", "server", "api", "src", "app", "lib", "services", "controllers", "routes", "middleware", "utils"],
             "file_patterns": [".py", ".java", ".go", ".rb", ".php", ".js", ".ts", ".cs", ".rs", ".swift", ".kt"],
-            "config_files": ["requirements.txt", "pom.xml", "build.gradle", "package.json", "composer.json", "Gemfile", "go.mod", "Cargo.toml"]
+            "config_files": ["requirements.txt", "pom.xml", "build.gradle", "package.json", "composer.json", "Gemfile", "go.mod", "Cargo.toml"],
+            "exclude_dirs": ["static", "public", "assets", "fixtures", "__snapshots__"]
         },
         "data": {
             "dir_types": ["database", "models", "schema", "migrations", "data", "db", "sql", "mongo", "redis", "cache"],
             "file_patterns": [".sql", ".py", ".js", ".ts", ".rb", ".php", ".json", ".yaml", ".yml", ".xml", ".csv"],
-            "config_files": ["schema.prisma", "sequelize.config.js", "typeorm.config.ts", "database.yml", "db.config.js"]
+            "config_files": ["schema.prisma", "sequelize.config.js", "typeorm.config.ts", "database.yml", "db.config.js"],
+            "exclude_dirs": ["static", "public", "assets", "__snapshots__"]
         }
     }
     
@@ -135,19 +148,11 @@ def select_relevant_files(repo_path: str, overview_json: Dict, role: str) -> Lis
         return []
     
     # First, check for configuration files
+    candidates = []
     for config_file in patterns.get("config_files", []):
-        config_path = os.path.join(repo_path, config_file)
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    relevant_files.append({
-                        "path": config_file,
-                        "content": content,
-                        "type": "config"
-                    })
-            except Exception as e:
-                print(f"Error reading config file {config_file}: {str(e)}")
+        entry = index.get(config_file)
+        if entry is not None:
+            candidates.append((entry, "config"))
     
     # Find relevant directories from overview
     relevant_dirs = [
@@ -157,49 +162,67 @@ def select_relevant_files(repo_path: str, overview_json: Dict, role: str) -> Lis
     
     # If no specific directories found, use common project directories
     if not relevant_dirs:
-        relevant_dirs = [d for d in patterns["dir_types"] if os.path.exists(os.path.join(repo_path, d))]
+        relevant_dirs = [d for d in patterns["dir_types"] if index.is_dir(d)]
     
     # If still no directories found, use the entire repo
     if not relevant_dirs:
-        relevant_dirs = [repo_path]
+        relevant_dirs = [""]
     
-    # Find relevant files
+    # Find relevant files; ignored paths were already pruned by the scanner, and the
+    # role's own rules skip vendored and generated files and its excluded directories
+    traversal_rules = TraversalRules(patterns.get("exclude_dirs", []))
+    seen = {entry.path for entry, _ in candidates}
     for directory in relevant_dirs:
-        dir_path = os.path.join(repo_path, directory)
-        if not os.path.exists(dir_path):
+        if not index.is_dir(directory):
+            continue
+
+        for entry in index.files_under(directory, traversal_rules):
+            if entry.path in seen or not any(entry.name.endswith(pattern) for pattern in patterns["file_patterns"]):
+                continue
+            seen.add(entry.path)
+            candidates.append((entry, "code"))
+
+    return candidates
+
+def load_relevant_files(candidates: List[Tuple[FileEntry, str]]) -> List[Dict]:
+    """Read the selected candidates into prompt-ready file dicts."""
+    relevant_files = []
+
+    # Only now read content: binary files are skipped, each file is condensed to
+    # ROLE_FILE_MAX_BYTES and selection stops once ROLE_TOTAL_MAX_BYTES is used up
+    remaining = ROLE_TOTAL_MAX_BYTES
+    for entry, file_type in candidates:
+        if remaining <= 0:
+            break
+        if entry.size == 0 or entry.is_binary():
+            continue
+        limit = min(ROLE_FILE_MAX_BYTES, remaining)
+        # Oversized source files are reduced to their skeleton rather than cut off
+        content = read_condensed(entry, limit)
+        if content is None:
             continue
-            
-        for root, _, files in os.walk(dir_path):
-            for file in files:
-                # Skip node_modules, .git, and other common non-relevant directories
-                if any(skip_dir in root for skip_dir in ['node_modules', '.git', 'dist', 'build', 'coverage']):
-                    continue
-                    
-                if any(file.endswith(pattern) for pattern in patterns["file_patterns"]):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            relevant_files.append({
-                                "path": os.path.relpath(file_path, repo_path),
-                                "content": content,
-                                "type": "code"
-                            })
-                    except Exception as e:
-                        print(f"Error reading {file_path}: {str(e)}")
+        remaining -= min(entry.size, len(content))
+        relevant_files.append({
+            "path": entry.path,
+            "content": content,
+            "type": file_type
+        })
     
     return relevant_files
 
 def generate_role_specific_prompt(role: str, overview_json: Dict, relevant_files: List[Dict]) -> str:
     """Generate a role-specific prompt for Gemini."""
-    # Group files by type
-    config_files = [f for f in relevant_files if f.get("type") == "config"]
-    code_files = [f for f in relevant_files if f.get("type") == "code"]
+    # Fit the files into the context budget, config files first, then group them by type
+    packed = pack_files(
+        {f["path"]: f["content"] for f in relevant_files},
+        priority=[f["path"] for f in relevant_files if f.get("type") == "config"]
+    )
+    file_types = {f["path"]: f.get("type") for f in relevant_files}
     
     # Create a summary of the files
     file_summary = {
-        "config_files": {f["path"]: f["content"] for f in config_files},
-        "code_files": {f["path"]: f["content"] for f in code_files}
+        "config_files": {path: content for path, content in packed.items() if file_types[path] == "config"},
+        "code_files": {path: content for path, content in packed.items() if file_types[path] == "code"}
     }
     
     role_prompts = {
@@ -446,35 +469,68 @@ def parse_stringified_json(obj):
         return val
     return try_parse(obj)
 
-def generate_multi_role_summary_report(repo_path: str, overview_json: Dict, gemini_client) -> Dict:
-    """Generate comprehensive role-specific summaries."""
+def analyze_role(role: str, repo_path: str, overview_json: Dict, gemini_client,
+                 index: Optional[RepoIndex] = None) -> Optional[Dict]:
+    """
+    Generate the summary for a single role, or None if the role has no prompt.
+
+    A role backed by source files is keyed on those files' content hashes, so its
+    previous summary is reused until one of them changes. A role without files
+    depends on the overview alone and is keyed on it instead.
+    """
+    index = index or scan_repository(repo_path)
+
+    # Select relevant files for this role
+    candidates = select_candidate_files(index, overview_json, role)
+    definition = {"role": role} if candidates else {"role": role, "overview": overview_json}
+    cache_key = make_analysis_key("role", definition, [entry for entry, _ in candidates])
+    cached_summary = get_cached_analysis(cache_key)
+    if cached_summary is not None:
+        return cached_summary
+
+    # Generate role-specific prompt
+    relevant_files = load_relevant_files(candidates)
+    prompt = generate_role_specific_prompt(role, overview_json, relevant_files)
+    if not prompt:
+        return None
+
+    # Get analysis from Gemini
+    response = gemini_client.generate_text_from_gemini(prompt)
+    role_summary = parse_gemini_response(response)
+    # Recursively parse stringified JSON in the summary
+    role_summary = parse_stringified_json(role_summary)
+    store_analysis(cache_key, role_summary)
+    return role_summary
+
+def generate_multi_role_summary_report(repo_path: str, overview_json: Dict, gemini_client,
+                                       max_workers: Optional[int] = None,
+                                       timeout: Optional[float] = None,
+                                       index: Optional[RepoIndex] = None) -> Dict:
+    """Generate comprehensive role-specific summaries, analyzing the roles concurrently."""
+    # Scan once and share the index between all roles
+    index = index or scan_repository(repo_path)
     roles = ["frontend", "backend", "data", "product"]
     report = {
         "project_overview": overview_json,
         "role_summaries": {}
     }
-    
-    for role in roles:
-        # Select relevant files for this role
-        relevant_files = select_relevant_files(repo_path, overview_json, role)
-        
-        # Generate role-specific prompt
-        prompt = generate_role_specific_prompt(role, overview_json, relevant_files)
-        if not prompt:
-            continue
-        
-        # Get analysis from Gemini
-        try:
-            response = gemini_client.generate_text_from_gemini(prompt)
-            role_summary = parse_gemini_response(response)
-            # Recursively parse stringified JSON in the summary
-            role_summary = parse_stringified_json(role_summary)
-            report["role_summaries"][f"{role}_summary"] = role_summary
-        except Exception as e:
-            print(f"Error generating {role} summary: {str(e)}")
+
+    outcomes = run_concurrently(
+        lambda role: analyze_role(role, repo_path, overview_json, gemini_client, index),
+        roles,
+        max_workers=max_workers or ROLE_ANALYSIS_MAX_WORKERS,
+        timeout=timeout or ROLE_ANALYSIS_TIMEOUT
+    )
+
+    # Outcomes come back in the same order as roles, keeping role_summaries deterministic
+    for role, (role_summary, error) in zip(roles, outcomes):
+        if error is not None:
+            print(f"Error generating {role} summary: {str(error)}")
             report["role_summaries"][f"{role}_summary"] = {
                 "error": f"Failed to generate {role} summary",
-                "details": str(e)
+                "details": str(error)
             }
-    
-    return report 
+        elif role_summary is not None:
+            report["role_summaries"][f"{role}_summary"] = role_summary
+
+    return report
@@ -4,10 +4,13 @@ from routes.repo_analysis import repo_analysis
 from routes.diagram import diagram
 from routes.feedback import feedback
 from routes.about import about
+from routes.jobs import jobs
+from utils.http_client import get_latency_metrics
+from utils.llm_cache import get_llm_cache
 
 import os
 import os
-from flask import request, redirect, render_template, session, url_for
+from flask import request, redirect, render_template, session, url_for, jsonify
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -25,11 +28,19 @@ app.register_blueprint(repo_analysis, url_prefix='/repo-analyzer')
 app.register_blueprint(diagram, url_prefix='/diagram-generator')
 app.register_blueprint(feedback, url_prefix='/feedback')
 app.register_blueprint(about,url_prefix='/about')
+app.register_blueprint(jobs, url_prefix='/jobs')
 
 @app.route('/')
 def home():
     return send_from_directory('templates', 'index.html')
 
+@app.route('/api/metrics')
+def metrics():
+    return jsonify({
+        "http": get_latency_metrics(),
+        "llm_cache": get_llm_cache().stats()
+    })
+
 def handler(environ, start_response):
     return app(environ, start_response)
 
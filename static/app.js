@@ -41,17 +41,16 @@ document.addEventListener('DOMContentLoaded', () => {
                     code: input,
                     role: role,
                     analysisType: analysisTypeSelect.value,
+                    stream: true,
                 })
             });
 
-            const data = await response.json();
-
             if (!response.ok) {
+                const data = await response.json();
                 throw new Error(data.error || 'Failed to analyze code');
             }
 
-            console.log(data)
-            displayOutput(data.response);
+            await readAnalysisStream(response);
             showFeedbackForm();
             
         } catch (error) {
@@ -63,6 +62,34 @@ document.addEventListener('DOMContentLoaded', () => {
 
 
 
+    // Render each server-sent event as it arrives instead of waiting for the full reply
+    async function readAnalysisStream(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+
+            for (const rawEvent of events) {
+                if (!rawEvent.startsWith('data:')) continue;
+                const event = JSON.parse(rawEvent.slice('data:'.length));
+                if (event.type === 'error') {
+                    throw new Error(event.error);
+                }
+                if (event.html) {
+                    hideLoading();
+                    displayOutput(event.html);
+                }
+            }
+        }
+    }
+
     async function submitFeedback() {
         if (!currentRating) {
             alert('Please select a rating');
@@ -0,0 +1,70 @@
+"""
+Cache of per-role and per-perspective analysis results for incremental re-analysis.
+
+A result is keyed by what it was computed from: the role or perspective definition
+and a manifest of the content hashes of the files it looked at. Re-running a
+repository after a small commit therefore only re-analyzes the roles and perspectives
+whose files changed; everything else is served from here.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+from utils.cache import CACHE_DIR, LRUCache, SqliteCache, TieredCache
+from utils.repo_scanner import FileEntry
+
+# Seconds a cached analysis result stays valid
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", str(30 * 24 * 3600)))
+# Maximum number of results kept on disk
+ANALYSIS_CACHE_DISK_ENTRIES = int(os.getenv("ANALYSIS_CACHE_DISK_ENTRIES", "20000"))
+# Set to 0 to always re-analyze
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "1") != "0"
+# Bump when prompts or parsing change so earlier results are not reused
+ANALYSIS_CACHE_VERSION = 1
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_analysis_cache() -> TieredCache:
+    """Returns the process-wide analysis result cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TieredCache(
+                LRUCache(max_entries=256, ttl=ANALYSIS_CACHE_TTL),
+                SqliteCache(
+                    os.path.join(CACHE_DIR, "analysis_cache.sqlite3"),
+                    table="analysis_results",
+                    max_entries=ANALYSIS_CACHE_DISK_ENTRIES,
+                    ttl=ANALYSIS_CACHE_TTL
+                )
+            )
+        return _cache
+
+def file_manifest(entries: Iterable[FileEntry]) -> str:
+    """Hashes the paths and content hashes of a set of files, independent of their order."""
+    digest = hashlib.sha256()
+    for path, content_hash in sorted((entry.path, entry.content_hash()) for entry in entries):
+        digest.update(f"{path}\0{content_hash}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def make_analysis_key(kind: str, definition: Any, entries: Iterable[FileEntry]) -> str:
+    """Returns the cache key for a role or perspective analysis over the given files."""
+    payload = json.dumps(
+        {"version": ANALYSIS_CACHE_VERSION, "kind": kind, "definition": definition, "files": file_manifest(entries)},
+        sort_keys=True
+    )
+    return f"{kind}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+def get_cached_analysis(key: str) -> Optional[Dict[str, Any]]:
+    """Returns the stored result for key, or None."""
+    if not ANALYSIS_CACHE_ENABLED:
+        return None
+    return get_analysis_cache().get(key)
+
+def store_analysis(key: str, result: Any) -> None:
+    """Stores a successful result; error results are never cached."""
+    if not ANALYSIS_CACHE_ENABLED or not isinstance(result, dict) or not result or "error" in result:
+        return
+    get_analysis_cache().set(key, result)
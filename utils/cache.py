@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Directory holding the on-disk caches
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class SqliteCache:
+    """
+    On-disk cache backed by a sqlite table. Values are stored as JSON.
+    Least recently used rows are evicted once the table grows past max_entries.
+    """
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 10000, ttl: Optional[float] = None):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection per operation keeps the cache safe to share across threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and (row[1] is None or row[1] > now):
+                    conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+                    self.hits += 1
+                    return json.loads(row[0])
+                if row is not None:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Error reading cache {self.path}: {str(e)}")
+        self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now)
+                )
+                count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+                    conn.execute(
+                        f"DELETE FROM {self.table} WHERE key IN ("
+                        f"SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT "
+                        f"MAX(0, (SELECT COUNT(*) FROM {self.table}) - ?))",
+                        (self.max_entries,)
+                    )
+        except sqlite3.Error as e:
+            print(f"Error writing cache {self.path}: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        try:
+            with self._connect() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Error writing cache {self.path}: {str(e)}")
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            entries = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+class TieredCache:
+    """Two-level cache: an in-memory LRU in front of a sqlite store."""
+
+    def __init__(self, memory: LRUCache, disk: Optional[SqliteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        missing = object()
+        value = self.memory.get(key, missing)
+        if value is missing and self.disk is not None:
+            value = self.disk.get(key, missing)
+            if value is not missing:
+                self.memory.set(key, value)
+        if value is missing:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
@@ -0,0 +1,191 @@
+"""
+Reduces source files to their skeleton: imports, signatures, class hierarchies,
+decorators, route definitions and docstrings, with function bodies left out.
+
+Python is parsed with ast; JavaScript and TypeScript use line-based heuristics.
+Skeletons are cached by content hash, so a file shared by several prompts is only
+processed once.
+"""
+import ast
+import hashlib
+import os
+import re
+from typing import List, Optional
+from utils.cache import LRUCache
+from utils.repo_scanner import FileEntry
+
+# Skeletons kept in memory, keyed by content hash
+CODE_SKELETON_CACHE_ENTRIES = int(os.getenv("CODE_SKELETON_CACHE_ENTRIES", "2048"))
+# Files larger than this are truncated rather than read in full for skeleton extraction
+SKELETON_SOURCE_MAX_BYTES = int(os.getenv("SKELETON_SOURCE_MAX_BYTES", "262144"))
+# Characters of a docstring or JSDoc summary kept in a skeleton
+DOCSTRING_MAX_CHARS = 300
+# Top-level statements longer than this are shortened to their target names
+STATEMENT_MAX_CHARS = 120
+
+PYTHON_EXTENSIONS = {".py", ".pyi", ".pyw"}
+JS_EXTENSIONS = {".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".mts", ".cts", ".vue", ".svelte"}
+
+_skeleton_cache = LRUCache(max_entries=CODE_SKELETON_CACHE_ENTRIES)
+
+def supports(path: str) -> bool:
+    """Returns True if a skeleton can be extracted for files like this one."""
+    ext = os.path.splitext(path)[1].lower()
+    return ext in PYTHON_EXTENSIONS or ext in JS_EXTENSIONS
+
+def _shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+# Python
+def _docstring_lines(node, pad: str) -> List[str]:
+    doc = ast.get_docstring(node)
+    if not doc:
+        return []
+    summary = _shorten(doc.strip().split("\n\n")[0], DOCSTRING_MAX_CHARS)
+    return [f'{pad}"""{summary.replace(chr(10), chr(10) + pad)}"""']
+
+def _is_main_guard(node) -> bool:
+    return (isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__")
+
+def _python_statements(body: List[ast.stmt], depth: int, lines: List[str]) -> None:
+    pad = "    " * depth
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            lines.extend(f"{pad}@{ast.unparse(d)}" for d in node.decorator_list)
+            prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+            lines.append(f"{pad}{prefix} {node.name}({ast.unparse(node.args)}){returns}:")
+            lines.extend(_docstring_lines(node, pad + "    "))
+            lines.append(f"{pad}    ...")
+        elif isinstance(node, ast.ClassDef):
+            lines.extend(f"{pad}@{ast.unparse(d)}" for d in node.decorator_list)
+            bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+            lines.append(f"{pad}class {node.name}({', '.join(bases)}):" if bases else f"{pad}class {node.name}:")
+            lines.extend(_docstring_lines(node, pad + "    "))
+            start = len(lines)
+            _python_statements(node.body, depth + 1, lines)
+            if len(lines) == start:
+                lines.append(f"{pad}    ...")
+        elif isinstance(node, (ast.Import, ast.ImportFrom)) and depth == 0:
+            lines.append(ast.unparse(node))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            text = ast.unparse(node)
+            if len(text) > STATEMENT_MAX_CHARS:
+                if isinstance(node, ast.AnnAssign):
+                    text = f"{ast.unparse(node.target)}: {ast.unparse(node.annotation)} = ..."
+                else:
+                    text = f"{' = '.join(ast.unparse(t) for t in node.targets)} = ..."
+            lines.append(f"{pad}{text}")
+        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and depth == 0:
+            # Module-level calls register routes, blueprints and handlers
+            lines.append(_shorten(ast.unparse(node), STATEMENT_MAX_CHARS))
+        elif _is_main_guard(node):
+            lines.append(f"{pad}if {ast.unparse(node.test)}:")
+            lines.append(f"{pad}    ...")
+        elif isinstance(node, ast.If) and depth == 0:
+            _python_statements(node.body, depth, lines)
+        elif isinstance(node, ast.Try) and depth == 0:
+            _python_statements(node.body, depth, lines)
+
+def python_skeleton(content: str) -> Optional[str]:
+    """Returns the skeleton of Python source, or None if it does not parse."""
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+    lines = _docstring_lines(tree, "")
+    _python_statements(tree.body, 0, lines)
+    return "\n".join(lines)
+
+# JavaScript / TypeScript
+JS_IMPORT_LINE = re.compile(r"^\s*(?:import\s|export\s+(?:\*|\{[^}]*\})\s+from\s|(?:const|let|var)\s+[\w{}\s,]+=\s*require\()")
+JS_DECLARATION = re.compile(
+    r"^\s*(?:export\s+(?:default\s+)?)?(?:declare\s+)?(?:abstract\s+)?"
+    r"(?:(?:async\s+)?function\b|class\s|interface\s|type\s+\w+|enum\s|namespace\s|module\s)"
+)
+JS_ARROW = re.compile(
+    r"^\s*(?:export\s+(?:default\s+)?)?(?:const|let|var)\s+\w+(?:\s*:\s*[^=]+)?\s*=\s*"
+    r"(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::\s*[^=]+)?=>|\w+\s*=>|class\b)"
+)
+JS_METHOD = re.compile(
+    r"^\s+(?:(?:public|private|protected|static|readonly|async|get|set|override)\s+)*"
+    r"(?!(?:if|for|while|switch|catch|return|function|else|do|with)\b)[\w$]+\s*(?:<[^>]*>)?\s*\([^)]*\)\s*(?::\s*[^{]+)?\{\s*$"
+)
+JS_ROUTE = re.compile(r"^\s*(?:app|router|server|api|route|routes|fastify)\.(?:get|post|put|patch|delete|all|use|route)\s*\(")
+JS_CONTAINER = re.compile(r"^\s*(?:export\s+(?:default\s+)?)?(?:declare\s+)?(?:abstract\s+)?(?:class|interface|enum|namespace|module)\s")
+JS_DECORATOR = re.compile(r"^\s*@\w")
+JSDOC_START = re.compile(r"^\s*/\*\*")
+
+def _strip_body(line: str) -> str:
+    stripped = line.rstrip()
+    # Container members are listed on their own lines, so only function bodies are elided
+    if stripped.endswith("{") and not JS_CONTAINER.match(line):
+        return stripped + " ... }"
+    return stripped
+
+def js_skeleton(content: str) -> str:
+    """Returns a heuristic skeleton of JavaScript or TypeScript source."""
+    lines = []
+    doc_summary = None
+    in_doc = False
+    doc_lines: List[str] = []
+    for line in content.splitlines():
+        if in_doc or JSDOC_START.match(line):
+            in_doc = "*/" not in line
+            text = line.strip().lstrip("/*").rstrip("*/").strip()
+            if text and not text.startswith("@"):
+                doc_lines.append(text)
+            if not in_doc:
+                doc_summary = _shorten(" ".join(doc_lines), DOCSTRING_MAX_CHARS) if doc_lines else None
+                doc_lines = []
+            continue
+
+        is_decorator = JS_DECORATOR.match(line)
+        if JS_IMPORT_LINE.match(line):
+            lines.append(line.rstrip())
+        elif is_decorator or JS_DECLARATION.match(line) or JS_ARROW.match(line) or JS_METHOD.match(line) or JS_ROUTE.match(line):
+            if doc_summary:
+                indent = line[:len(line) - len(line.lstrip())]
+                lines.append(f"{indent}/** {doc_summary} */")
+                doc_summary = None
+            if is_decorator:
+                lines.append(line.rstrip())
+                continue
+            lines.append(_shorten(_strip_body(line), STATEMENT_MAX_CHARS * 2))
+        elif line.strip():
+            doc_summary = None
+            continue
+        doc_summary = None
+    return "\n".join(lines)
+
+def skeletonize(path: str, content: str) -> Optional[str]:
+    """Returns the skeleton of a source file, or None for unsupported or unparsable files."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in PYTHON_EXTENSIONS and ext not in JS_EXTENSIONS:
+        return None
+    key = f"{ext}:{hashlib.sha256(content.encode('utf-8')).hexdigest()}"
+    skeleton = _skeleton_cache.get(key)
+    if skeleton is None:
+        skeleton = python_skeleton(content) if ext in PYTHON_EXTENSIONS else js_skeleton(content)
+        # Cache failures too, as an empty string, so unparsable files are not retried
+        _skeleton_cache.set(key, skeleton or "")
+    return skeleton or None
+
+def read_condensed(entry: FileEntry, max_bytes: int) -> Optional[str]:
+    """
+    Reads an indexed file for a prompt: in full when it fits max_bytes, as its
+    skeleton when it does not, and truncated when no skeleton is available.
+    """
+    if not entry.is_truncated_at(max_bytes):
+        return entry.read(max_bytes)
+    if supports(entry.path):
+        source = entry.read(SKELETON_SOURCE_MAX_BYTES)
+        skeleton = skeletonize(entry.path, source) if source else None
+        if skeleton:
+            encoded = skeleton.encode("utf-8")
+            if len(encoded) <= max_bytes:
+                return skeleton + "\n... (skeleton: bodies omitted)"
+            return encoded[:max_bytes].decode("utf-8", errors="ignore") + "\n... (skeleton truncated)"
+    content = entry.read(max_bytes)
+    return None if content is None else content + "\n... (truncated)"
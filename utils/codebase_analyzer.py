@@ -1,20 +1,32 @@
 import os
 import json
 import mistune
-from typing import Dict, List, Any
-
-def get_enhanced_codebase_map_and_perspectives(repo_path: str, gemini_client) -> Dict[str, Any]:
+from typing import Dict, List, Any, Optional, Tuple
+from utils.concurrency import run_concurrently
+from utils.context_packer import pack_files
+from utils.repo_scanner import FileEntry, RepoIndex, scan_repository
+from utils.analysis_cache import get_cached_analysis, make_analysis_key, store_analysis
+from utils.code_skeleton import read_condensed
+
+# Maximum number of perspectives analyzed at the same time
+PERSPECTIVE_ANALYSIS_MAX_WORKERS = int(os.getenv("PERSPECTIVE_ANALYSIS_MAX_WORKERS", "4"))
+# Seconds a single perspective analysis may run before it is reported as failed
+PERSPECTIVE_ANALYSIS_TIMEOUT = float(os.getenv("PERSPECTIVE_ANALYSIS_TIMEOUT", "180"))
+
+def get_enhanced_codebase_map_and_perspectives(repo_path: str, gemini_client,
+                                               index: Optional[RepoIndex] = None) -> Dict[str, Any]:
     """
     Analyzes the codebase to identify major functional perspectives and their characteristics.
     """
+    index = index or scan_repository(repo_path)
+
     # 1. Gather context: README, config files, directory structure
-    readme = read_file_if_exists(os.path.join(repo_path, "README.md"))
+    readme = read_indexed_file(index, "README.md")
     config_files = []
     for fname in ["package.json", "pyproject.toml", "requirements.txt", "Pipfile", "setup.py"]:
-        fpath = os.path.join(repo_path, fname)
-        if os.path.exists(fpath):
-            config_files.append((fname, read_file_if_exists(fpath)))
-    dir_structure = get_top_level_directory_structure(repo_path)
+        if index.get(fname) is not None:
+            config_files.append((fname, read_indexed_file(index, fname)))
+    dir_structure = get_top_level_directory_structure(repo_path, index)
 
     # 2. Build the prompt
     prompt = build_gemini_perspective_prompt(readme, config_files, dir_structure)
@@ -30,48 +42,78 @@ def get_enhanced_codebase_map_and_perspectives(repo_path: str, gemini_client) ->
 
     return codebase_perspectives_json
 
-def generate_detailed_perspective_analysis_report(repo_path: str, codebase_perspectives_json: Dict[str, Any], gemini_client) -> Dict[str, Any]:
+def analyze_perspective(repo_path: str, project_summary: str, perspective: Dict[str, Any], gemini_client,
+                        index: Optional[RepoIndex] = None) -> Dict[str, Any]:
+    """
+    Gathers the files for a single perspective and asks Gemini to analyze them.
+    The result is reused for as long as the perspective and its files are unchanged.
+    """
+    index = index or scan_repository(repo_path)
+    entries = perspective_file_entries(perspective, index)
+    definition = {
+        key: perspective.get(key)
+        for key in ("perspective_name", "details", "key_directories", "entry_points_or_main_files")
+    }
+    cache_key = make_analysis_key("perspective", definition, [entry for _, entry in entries])
+    cached_report = get_cached_analysis(cache_key)
+    if cached_report is not None:
+        return cached_report
+
+    files_content = read_perspective_files(entries)
+
+    # Select appropriate prompt based on perspective type
+    if "Frontend" in perspective["perspective_name"]:
+        prompt = build_frontend_ui_layer_prompt(project_summary, perspective, files_content)
+    elif "Backend" in perspective["perspective_name"]:
+        prompt = build_backend_api_layer_prompt(project_summary, perspective, files_content)
+    else:
+        # Generic prompt for other perspectives
+        prompt = build_generic_perspective_prompt(project_summary, perspective, files_content)
+
+    # Get Gemini's analysis
+    gemini_response = gemini_client.generate_content(prompt)
+    markdown_output = gemini_response.text
+
+    # Parse markdown to JSON based on perspective type
+    if "Frontend" in perspective["perspective_name"]:
+        perspective_report = parse_frontend_ui_layer_markdown(markdown_output)
+    elif "Backend" in perspective["perspective_name"]:
+        perspective_report = parse_backend_api_layer_markdown(markdown_output)
+    else:
+        perspective_report = parse_generic_markdown(markdown_output)
+    store_analysis(cache_key, perspective_report)
+    return perspective_report
+
+def generate_detailed_perspective_analysis_report(repo_path: str, codebase_perspectives_json: Dict[str, Any], gemini_client,
+                                                  max_workers: Optional[int] = None,
+                                                  timeout: Optional[float] = None,
+                                                  index: Optional[RepoIndex] = None) -> Dict[str, Any]:
     """
     Generates detailed analysis for each identified perspective.
+
+    Perspectives are analyzed concurrently. A perspective that fails or times out is
+    reported with an error entry so the returned dict always covers every perspective.
+    The repository is scanned once and the index is shared by all perspectives.
     """
-    perspective_reports = {}
-    
-    for perspective in codebase_perspectives_json["identified_perspectives"]:
-        files_content = gather_files_for_perspective(repo_path, perspective)
-        
-        # Select appropriate prompt based on perspective type
-        if "Frontend" in perspective["perspective_name"]:
-            prompt = build_frontend_ui_layer_prompt(
-                codebase_perspectives_json["project_summary"],
-                perspective,
-                files_content
-            )
-        elif "Backend" in perspective["perspective_name"]:
-            prompt = build_backend_api_layer_prompt(
-                codebase_perspectives_json["project_summary"],
-                perspective,
-                files_content
-            )
-        else:
-            # Generic prompt for other perspectives
-            prompt = build_generic_perspective_prompt(
-                codebase_perspectives_json["project_summary"],
-                perspective,
-                files_content
-            )
-
-        # Get Gemini's analysis
-        gemini_response = gemini_client.generate_content(prompt)
-        markdown_output = gemini_response.text
-
-        # Parse markdown to JSON based on perspective type
-        if "Frontend" in perspective["perspective_name"]:
-            perspective_json = parse_frontend_ui_layer_markdown(markdown_output)
-        elif "Backend" in perspective["perspective_name"]:
-            perspective_json = parse_backend_api_layer_markdown(markdown_output)
-        else:
-            perspective_json = parse_generic_markdown(markdown_output)
+    perspectives = codebase_perspectives_json["identified_perspectives"]
+    project_summary = codebase_perspectives_json["project_summary"]
+    index = index or scan_repository(repo_path)
+
+    outcomes = run_concurrently(
+        lambda perspective: analyze_perspective(repo_path, project_summary, perspective, gemini_client, index),
+        perspectives,
+        max_workers=max_workers or PERSPECTIVE_ANALYSIS_MAX_WORKERS,
+        timeout=timeout or PERSPECTIVE_ANALYSIS_TIMEOUT
+    )
 
+    perspective_reports = {}
+    for perspective, (perspective_json, error) in zip(perspectives, outcomes):
+        if error is not None:
+            print(f"Error analyzing perspective {perspective['perspective_name']}: {str(error)}")
+            perspective_json = {
+                "error": f"Failed to analyze {perspective['perspective_name']}",
+                "details": str(error)
+            }
         perspective_reports[perspective["perspective_name"]] = perspective_json
 
     return perspective_reports
@@ -87,64 +129,60 @@ def consolidate_analysis_report(codebase_perspectives_json: Dict[str, Any], pers
     }
 
 # Helper functions
-def read_file_if_exists(path: str) -> str:
-    """Reads a file if it exists, returns empty string otherwise."""
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
-    except Exception:
+def read_indexed_file(index: RepoIndex, rel_path: str) -> str:
+    """Reads a file through the repository index, returns empty string if it is missing or unreadable."""
+    entry = index.get(rel_path)
+    if entry is None:
         return ""
+    return entry.read() or ""
 
-def get_top_level_directory_structure(repo_path: str) -> str:
+def get_top_level_directory_structure(repo_path: str, index: Optional[RepoIndex] = None) -> str:
     """Returns a string representation of the top-level directory structure."""
-    entries = os.listdir(repo_path)
-    structure = []
-    for entry in entries:
-        full_path = os.path.join(repo_path, entry)
-        if os.path.isdir(full_path):
-            structure.append(f"{entry}/")
-        else:
-            structure.append(entry)
-    return "\n".join(structure)
-
-def gather_files_for_perspective(repo_path: str, perspective: Dict[str, Any], max_file_size: int = 10000) -> Dict[str, str]:
+    index = index or scan_repository(repo_path)
+    return "\n".join(index.top_level_entries())
+
+def gather_files_for_perspective(repo_path: str, perspective: Dict[str, Any], max_file_size: int = 10000,
+                                 index: Optional[RepoIndex] = None) -> Dict[str, str]:
     """
     Gathers the content of entry point files and all files in key directories for a perspective.
-    Truncates or summarizes files if they are too large.
+    Files larger than max_file_size are reduced to their skeleton, or truncated if none is available.
     """
-    files_content = {}
+    index = index or scan_repository(repo_path)
+    return read_perspective_files(perspective_file_entries(perspective, index), max_file_size)
+
+def perspective_file_entries(perspective: Dict[str, Any], index: RepoIndex) -> List[Tuple[str, FileEntry]]:
+    """Lists the (name, entry) pairs a perspective covers, without reading more than a binary sniff."""
+    entries = {}
     
     # Gather entry point files
     for file_rel in perspective.get("entry_points_or_main_files", []):
-        file_path = os.path.join(repo_path, file_rel)
-        if os.path.exists(file_path):
-            files_content[file_rel] = read_file_with_limit(file_path, max_file_size)
+        entry = index.get(file_rel)
+        if entry is not None:
+            entries[file_rel] = entry
     
     # Gather files in key directories
     for dir_rel in perspective.get("key_directories", []):
-        dir_path = os.path.join(repo_path, dir_rel)
-        if os.path.isdir(dir_path):
-            for root, _, files in os.walk(dir_path):
-                for fname in files:
-                    fpath = os.path.join(root, fname)
-                    rel_path = os.path.relpath(fpath, repo_path)
-                    if rel_path not in files_content:
-                        files_content[rel_path] = read_file_with_limit(fpath, max_file_size)
+        if not index.is_dir(dir_rel):
+            continue
+        for entry in index.files_under(dir_rel):
+            if entry.path not in entries and not entry.is_binary():
+                entries[entry.path] = entry
     
-    return files_content
+    return list(entries.items())
 
-def read_file_with_limit(path: str, max_size: int) -> str:
-    """Reads a file with a size limit."""
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            content = f.read()
-            if len(content) > max_size:
-                return content[:max_size] + "\n... (truncated)"
-            return content
-    except Exception:
-        return ""
+def read_perspective_files(entries: List[Tuple[str, FileEntry]], max_file_size: int = 10000) -> Dict[str, str]:
+    """Reads the listed files, reducing those larger than max_file_size to their skeleton."""
+    return {name: read_condensed(entry, max_file_size) or "" for name, entry in entries}
 
 # Prompt building functions
+def format_files_for_prompt(perspective: Dict[str, Any], files_content: Dict[str, str]) -> str:
+    """Packs a perspective's files into the context budget, entry points first, as Markdown sections."""
+    packed = pack_files(files_content, priority=perspective.get("entry_points_or_main_files", []))
+    return "\n".join(
+        f"### {fname}\n```\n{content}\n```"
+        for fname, content in packed.items()
+    )
+
 def build_gemini_perspective_prompt(readme: str, config_files: List[tuple], dir_structure: str) -> str:
     """Builds the initial perspective detection prompt for Gemini."""
     config_str = "\n".join(
@@ -202,10 +240,7 @@ Return ONLY the JSON object, nothing else.
 
 def build_frontend_ui_layer_prompt(project_summary: str, perspective: Dict[str, Any], files_content: Dict[str, str]) -> str:
     """Builds the Frontend UI Layer analysis prompt for Gemini."""
-    files_list = "\n".join([
-        f"### {fname}\n```\n{content[:2000]}{'... (truncated)' if len(content) > 2000 else ''}\n```"
-        for fname, content in files_content.items()
-    ])
+    files_list = format_files_for_prompt(perspective, files_content)
     
     return f"""
 You are a Senior Frontend Architect. Analyze the provided Frontend UI Layer code files for a {perspective['details']} application. The overall project context is: {project_summary}
@@ -253,10 +288,7 @@ For each major UI component file provided:
 
 def build_backend_api_layer_prompt(project_summary: str, perspective: Dict[str, Any], files_content: Dict[str, str]) -> str:
     """Builds the Backend API Layer analysis prompt for Gemini."""
-    files_list = "\n".join([
-        f"### {fname}\n```\n{content[:2000]}{'... (truncated)' if len(content) > 2000 else ''}\n```"
-        for fname, content in files_content.items()
-    ])
+    files_list = format_files_for_prompt(perspective, files_content)
     
     return f"""
 You are a Senior Backend Architect. Analyze the provided Backend API Layer code files for a {perspective['details']} application. The overall project context is: {project_summary}
@@ -302,10 +334,7 @@ Select 2-3 critical endpoints:
 
 def build_generic_perspective_prompt(project_summary: str, perspective: Dict[str, Any], files_content: Dict[str, str]) -> str:
     """Builds a generic analysis prompt for other perspectives."""
-    files_list = "\n".join([
-        f"### {fname}\n```\n{content[:2000]}{'... (truncated)' if len(content) > 2000 else ''}\n```"
-        for fname, content in files_content.items()
-    ])
+    files_list = format_files_for_prompt(perspective, files_content)
     
     return f"""
 You are a Senior Software Architect. Analyze the provided {perspective['perspective_name']} code files. The overall project context is: {project_summary}
@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+# How often pending tasks are checked against their timeout
+POLL_INTERVAL = 0.1
+
+def run_concurrently(func: Callable[[Any], Any], items: Iterable[Any], max_workers: int = 4,
+                     timeout: Optional[float] = None) -> List[Tuple[Any, Optional[BaseException]]]:
+    """
+    Runs func over items on a bounded thread pool.
+
+    Returns a list of (result, error) tuples in the same order as items, so callers
+    get deterministic output regardless of completion order. The timeout applies to
+    each task individually and is measured from the moment the task starts running;
+    a task that exceeds it is reported as a TimeoutError and left to finish in the
+    background.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    started = {}
+
+    def run(index, item):
+        started[index] = time.monotonic()
+        return func(item)
+
+    outcomes: List[Tuple[Any, Optional[BaseException]]] = [(None, None)] * len(items)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    futures = {executor.submit(run, index, item): index for index, item in enumerate(items)}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                outcomes[futures[future]] = (None, error) if error else (future.result(), None)
+
+            if timeout is None:
+                continue
+            now = time.monotonic()
+            for future in list(pending):
+                index = futures[future]
+                if index in started and now - started[index] > timeout:
+                    pending.discard(future)
+                    outcomes[index] = (None, TimeoutError(f"Task timed out after {timeout} seconds"))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return outcomes
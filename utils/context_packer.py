@@ -0,0 +1,159 @@
+"""
+Fits source files into a prompt's token budget.
+
+Files are ranked by relevance (entry points first, then files the others import,
+then smaller files) and added greedily while they fit. A file that does not fit in
+full is replaced by its skeleton (or, for other languages, an outline of its import
+and definition lines), and dropped only if even that does not fit.
+"""
+import math
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+from utils.code_skeleton import skeletonize
+
+# Tokens of file content allowed in a single prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "20000"))
+# Largest share of the budget one file may take in full before it is outlined instead
+CONTEXT_MAX_FILE_SHARE = float(os.getenv("CONTEXT_MAX_FILE_SHARE", "0.5"))
+# Average characters per token, used to estimate prompt size without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# File names that usually hold an application's entry point
+ENTRY_POINT_NAMES = {
+    "main.py", "app.py", "server.py", "manage.py", "wsgi.py", "asgi.py", "__main__.py", "urls.py",
+    "index.js", "main.js", "app.js", "server.js", "index.ts", "main.ts", "app.ts", "server.ts",
+    "index.jsx", "index.tsx", "App.jsx", "App.tsx", "App.vue", "main.go", "Main.java", "Program.cs",
+    "index.html", "routes.py", "routes.js", "schema.prisma", "schema.sql",
+}
+
+PYTHON_IMPORT = re.compile(r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+\(?([\w, ]+)|import\s+([\w.]+))", re.MULTILINE)
+JS_IMPORT = re.compile(r"""(?:\bfrom\s*|\brequire\(\s*|\bimport\s*\(?\s*)['"]([^'"]+)['"]""")
+
+# Lines kept in an outline: imports, definitions and exported or top-level declarations
+OUTLINE_LINE = re.compile(
+    r"^\s*(?:@\w|(?:async\s+)?def\s|class\s|from\s|import\s|export\s|module\.exports|"
+    r"(?:async\s+)?function\b|(?:const|let|var)\s+\w+\s*=\s*(?:async\s*)?(?:\(|function|class|\w+\s*=>)|"
+    r"(?:public|private|protected|static|func|fn|type|interface|struct|enum|package)\s)"
+)
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of tokens in text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def outline_content(path: str, content: str) -> str:
+    """Reduces a file to its code skeleton, or failing that to its import and definition lines."""
+    skeleton = skeletonize(path, content)
+    if skeleton:
+        return skeleton + "\n... (skeleton: bodies omitted)"
+    lines = [line.rstrip() for line in content.splitlines() if OUTLINE_LINE.match(line)]
+    if not lines:
+        return ""
+    return "\n".join(lines) + "\n... (outline: bodies omitted)"
+
+def _module_keys(path: str) -> List[str]:
+    """Names another file could use to import this one, as '/'-separated paths without extension."""
+    stem = os.path.splitext(path.replace(os.sep, "/"))[0]
+    keys = [stem]
+    if stem.endswith("/__init__") or stem.endswith("/index"):
+        keys.append(stem.rsplit("/", 1)[0])
+    return keys
+
+def _import_targets(path: str, content: str) -> List[str]:
+    """Returns the imports in a file as '/'-separated paths, resolving relative ones."""
+    directory = os.path.dirname(path.replace(os.sep, "/"))
+    targets = []
+    if path.endswith((".py", ".pyi")):
+        for match in PYTHON_IMPORT.finditer(content):
+            module = match.group(1) if match.group(1) is not None else match.group(3)
+            dots = len(module) - len(module.lstrip("."))
+            name = module.lstrip(".").replace(".", "/")
+            if dots:
+                base = directory
+                for _ in range(dots - 1):
+                    base = os.path.dirname(base)
+                name = f"{base}/{name}".strip("/")
+            # "from package import module" may name submodules rather than attributes
+            for imported in (match.group(2) or "").split(","):
+                imported = imported.strip().split(" ")[0]
+                if imported:
+                    targets.append(f"{name}/{imported}".strip("/"))
+            targets.append(name)
+    else:
+        for match in JS_IMPORT.finditer(content):
+            target = match.group(1)
+            if target.startswith("."):
+                target = os.path.normpath(os.path.join(directory, target)).replace(os.sep, "/")
+            targets.append(target)
+    return targets
+
+def count_inbound_imports(files: Dict[str, str]) -> Dict[str, int]:
+    """Counts, for every file, how many of the other files import it."""
+    owners: Dict[str, str] = {}
+    for path in files:
+        for key in _module_keys(path):
+            owners.setdefault(key, path)
+
+    counts = {path: 0 for path in files}
+    for path, content in files.items():
+        imported = set()
+        for target in _import_targets(path, content):
+            # Absolute imports may be rooted below the repository root, so try each suffix
+            parts = target.split("/")
+            for start in range(len(parts)):
+                owner = owners.get("/".join(parts[start:]))
+                if owner:
+                    imported.add(owner)
+                    break
+        for owner in imported - {path}:
+            counts[owner] += 1
+    return counts
+
+def rank_files(files: Dict[str, str], priority: Iterable[str] = ()) -> List[str]:
+    """Orders paths by relevance: priority paths, entry points, import fan-in, then size."""
+    priority = {os.path.normpath(p) for p in priority}
+    inbound = count_inbound_imports(files)
+
+    def score(path: str) -> float:
+        value = 0.0
+        if os.path.normpath(path) in priority:
+            value += 100
+        if os.path.basename(path) in ENTRY_POINT_NAMES:
+            value += 10
+        value += 3 * inbound[path]
+        # Prefer smaller files among otherwise equal candidates
+        value -= math.log10(len(files[path]) + 10)
+        return value
+
+    return sorted(files, key=score, reverse=True)
+
+def pack_files(files: Dict[str, str], budget_tokens: Optional[int] = None,
+               priority: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Returns the files that fit the token budget, most relevant first. Files are kept
+    whole when they fit, outlined when they do not, and left out when even the
+    outline does not fit.
+    """
+    budget = budget_tokens if budget_tokens is not None else CONTEXT_TOKEN_BUDGET
+    max_file_tokens = budget * CONTEXT_MAX_FILE_SHARE
+    remaining = budget
+    packed: Dict[str, str] = {}
+    omitted = []
+    for path in rank_files(files, priority):
+        content = files[path]
+        tokens = estimate_tokens(content)
+        if tokens <= remaining and tokens <= max_file_tokens:
+            packed[path] = content
+            remaining -= tokens
+            continue
+        outline = outline_content(path, content)
+        outline_tokens = estimate_tokens(outline)
+        if outline and outline_tokens <= remaining:
+            packed[path] = outline
+            remaining -= outline_tokens
+        else:
+            omitted.append(path)
+
+    if omitted:
+        print(f"Context budget of {budget} tokens reached; left out {len(omitted)} file(s)")
+    return packed
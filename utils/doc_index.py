@@ -0,0 +1,226 @@
+"""
+Local retrieval index over the reference snippets in knowledge_base/.
+
+Each markdown file is split into one snippet per "##" section and indexed with BM25
+in an inverted index. The index is persisted to CACHE_DIR and rebuilt incrementally:
+only files whose content changed since the last build are re-tokenized.
+
+Build or refresh the index offline with:
+
+    python -m utils.doc_index
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from utils.cache import CACHE_DIR
+
+# Directory holding the reference documents
+KNOWLEDGE_BASE_DIR = os.getenv("KNOWLEDGE_BASE_DIR", "knowledge_base")
+DOC_INDEX_PATH = os.path.join(CACHE_DIR, "doc_index.json")
+# Snippets scoring below this are treated as irrelevant
+DOC_INDEX_MIN_SCORE = float(os.getenv("DOC_INDEX_MIN_SCORE", "2.0"))
+# Seconds between checks of the knowledge base for changed files
+DOC_INDEX_REFRESH_INTERVAL = float(os.getenv("DOC_INDEX_REFRESH_INTERVAL", "60"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+INDEX_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_+#]*")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "if",
+    "in", "into", "is", "it", "its", "not", "of", "on", "or", "so", "such", "that", "the",
+    "their", "them", "then", "there", "these", "they", "this", "to", "use", "was", "when",
+    "where", "which", "while", "will", "with", "you", "your", "can", "do", "does", "how",
+    "what", "why", "code", "following", "here", "should",
+}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases text and splits it into index terms, dropping stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+def split_snippets(text: str) -> List[Tuple[str, str]]:
+    """Splits a markdown document into (title, body) pairs, one per '##' section."""
+    snippets = []
+    doc_title = ""
+    title = None
+    body: List[str] = []
+    for line in text.splitlines():
+        if line.startswith("## "):
+            if title is not None and body:
+                snippets.append((title, "\n".join(body).strip()))
+            title = line[3:].strip()
+            body = []
+        elif line.startswith("# ") and title is None:
+            doc_title = line[2:].strip()
+        elif title is not None:
+            body.append(line)
+    if title is not None and body:
+        snippets.append((title, "\n".join(body).strip()))
+    if not snippets and text.strip():
+        snippets.append((doc_title, text.strip()))
+    return [(f"{doc_title}: {t}" if doc_title and t != doc_title else t, b) for t, b in snippets]
+
+class DocIndex:
+    """BM25 inverted index over knowledge base snippets."""
+
+    def __init__(self):
+        # source file -> content hash
+        self.sources: Dict[str, str] = {}
+        # snippet id -> {"source", "title", "text", "length"}
+        self.snippets: Dict[str, Dict] = {}
+        # term -> {snippet id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+
+    def _add_snippet(self, snippet_id: str, source: str, title: str, text: str) -> None:
+        terms = tokenize(f"{title} {title} {text}")
+        self.snippets[snippet_id] = {"source": source, "title": title, "text": text, "length": len(terms)}
+        self.total_length += len(terms)
+        for term, count in Counter(terms).items():
+            self.postings.setdefault(term, {})[snippet_id] = count
+
+    def _remove_source(self, source: str) -> None:
+        removed = {sid for sid, snippet in self.snippets.items() if snippet["source"] == source}
+        if not removed:
+            return
+        for sid in removed:
+            self.total_length -= self.snippets.pop(sid)["length"]
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for sid in removed.intersection(posting):
+                del posting[sid]
+            if not posting:
+                del self.postings[term]
+        self.sources.pop(source, None)
+
+    def update_from_directory(self, directory: str) -> bool:
+        """Re-indexes new or changed files and drops deleted ones. Returns True if anything changed."""
+        current = {}
+        if os.path.isdir(directory):
+            for root, _, files in os.walk(directory):
+                for fname in files:
+                    if fname.endswith((".md", ".txt")):
+                        path = os.path.join(root, fname)
+                        current[os.path.relpath(path, directory)] = path
+
+        changed = False
+        for source in set(self.sources) - set(current):
+            self._remove_source(source)
+            changed = True
+
+        for source, path in current.items():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except Exception as e:
+                print(f"Error reading {path}: {str(e)}")
+                continue
+            content_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            if self.sources.get(source) == content_hash:
+                continue
+            self._remove_source(source)
+            for position, (title, body) in enumerate(split_snippets(text)):
+                self._add_snippet(f"{source}#{position}", source, title, body)
+            self.sources[source] = content_hash
+            changed = True
+        return changed
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0) -> List[Dict]:
+        """Returns up to k snippets ranked by BM25 score."""
+        count = len(self.snippets)
+        if not count:
+            return []
+        avg_length = self.total_length / count
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for sid, tf in posting.items():
+                length = self.snippets[sid]["length"]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                scores[sid] = scores.get(sid, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            {"title": self.snippets[sid]["title"], "text": self.snippets[sid]["text"], "score": score}
+            for sid, score in ranked if score >= min_score
+        ]
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": INDEX_VERSION,
+            "sources": self.sources,
+            "snippets": self.snippets,
+            "postings": self.postings,
+            "total_length": self.total_length,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DocIndex":
+        index = cls()
+        if data.get("version") != INDEX_VERSION:
+            return index
+        index.sources = data["sources"]
+        index.snippets = data["snippets"]
+        index.postings = data["postings"]
+        index.total_length = data["total_length"]
+        return index
+
+def load_index(path: str = DOC_INDEX_PATH) -> DocIndex:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return DocIndex.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return DocIndex()
+
+def save_index(index: DocIndex, path: str = DOC_INDEX_PATH) -> None:
+    """Writes the index atomically so concurrent readers never see a partial file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index.to_dict(), f)
+    os.replace(tmp_path, path)
+
+def build_index(directory: str = KNOWLEDGE_BASE_DIR, path: str = DOC_INDEX_PATH) -> DocIndex:
+    """Loads the persisted index, re-indexes changed documents and saves it back."""
+    index = load_index(path)
+    if index.update_from_directory(directory):
+        save_index(index, path)
+    return index
+
+_index: Optional[DocIndex] = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+def get_doc_index() -> DocIndex:
+    """Returns the process-wide index, picking up knowledge base edits every DOC_INDEX_REFRESH_INTERVAL seconds."""
+    global _index, _index_checked_at
+    with _index_lock:
+        now = time.monotonic()
+        if _index is None or now - _index_checked_at >= DOC_INDEX_REFRESH_INTERVAL:
+            _index = build_index()
+            _index_checked_at = now
+        return _index
+
+def search_docs(query: str, k: int = 3) -> List[Dict]:
+    """Returns the top-k relevant knowledge base snippets for a query."""
+    return get_doc_index().search(query, k=k, min_score=DOC_INDEX_MIN_SCORE)
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else KNOWLEDGE_BASE_DIR
+    start = time.perf_counter()
+    built = build_index(directory)
+    print(f"Indexed {len(built.snippets)} snippets from {len(built.sources)} files "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms -> {DOC_INDEX_PATH}")
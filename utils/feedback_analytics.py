@@ -0,0 +1,92 @@
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+# Bucket sizes of the rollups in seconds, finest first
+BUCKET_RESOLUTIONS = (300, 3600)
+# Rolling windows reported by the analytics API, as (name, seconds, bucket size). The
+# 1h window uses 5 minute buckets, so it is a rolling hour rather than the current,
+# partly elapsed clock hour compared with a full one.
+ANALYTICS_WINDOWS = (("1h", 3600, 300), ("24h", 24 * 3600, 3600), ("7d", 7 * 24 * 3600, 3600))
+# Buckets kept per (type, role) for each bucket size: enough to compare the longest
+# window at that size with the one before it, plus the current partial bucket
+BUCKET_RETENTION = {
+    resolution: 2 * max(seconds for _, seconds, size in ANALYTICS_WINDOWS if size == resolution) // resolution + 1
+    for resolution in BUCKET_RESOLUTIONS
+}
+# Change in average rating between two windows below which the trend is reported as flat
+TREND_THRESHOLD = 0.25
+# Label used for feedback submitted without a role
+UNSPECIFIED_ROLE = "unspecified"
+
+def _average(count, rating_sum) -> Optional[float]:
+    return rating_sum / count if count else None
+
+def _window_totals(aggregates, start: float, end: float, resolution: int):
+    count = rating_sum = 0
+    for aggregate in aggregates:
+        window_count, window_sum = aggregate.window(start, end, resolution)
+        count += window_count
+        rating_sum += window_sum
+    return count, rating_sum
+
+def rollup(aggregates: Iterable, now: float) -> Dict:
+    """
+    Combines FeedbackAggregates into totals, a rating histogram and rolling windows.
+    Windows have the resolution of their bucket size: each ends with the current bucket
+    and is compared with the window of the same length just before it.
+    """
+    aggregates = list(aggregates)
+    count = sum(aggregate.count for aggregate in aggregates)
+    rating_sum = sum(aggregate.rating_sum for aggregate in aggregates)
+
+    histogram = {str(rating): 0 for rating in range(1, 6)}
+    for aggregate in aggregates:
+        for rating, rating_count in aggregate.histogram.items():
+            histogram[str(rating)] = histogram.get(str(rating), 0) + rating_count
+
+    windows = {}
+    for name, seconds, resolution in ANALYTICS_WINDOWS:
+        end = (int(now // resolution) + 1) * resolution
+        current_count, current_sum = _window_totals(aggregates, end - seconds, end, resolution)
+        previous_count, previous_sum = _window_totals(aggregates, end - 2 * seconds, end - seconds, resolution)
+        current_average = _average(current_count, current_sum)
+        previous_average = _average(previous_count, previous_sum)
+        trend = None
+        direction = None
+        if current_average is not None and previous_average is not None:
+            trend = current_average - previous_average
+            direction = "up" if trend > TREND_THRESHOLD else "down" if trend < -TREND_THRESHOLD else "flat"
+        windows[name] = {
+            "count": current_count,
+            "average_rating": current_average,
+            "previous_count": previous_count,
+            "previous_average_rating": previous_average,
+            "trend": trend,
+            "direction": direction
+        }
+
+    return {
+        "total_feedback": count,
+        "average_rating": _average(count, rating_sum) or 0,
+        "histogram": histogram,
+        "windows": windows
+    }
+
+def build_analytics(aggregates: Dict, feedback_types: Iterable[str], now: Optional[float] = None) -> Dict:
+    """Builds the per-type and per-role analytics from the learner's (type, role) aggregates."""
+    now = time.time() if now is None else now
+    by_type: Dict[str, Dict] = {feedback_type: {} for feedback_type in feedback_types}
+    for (feedback_type, role), aggregate in aggregates.items():
+        by_type.setdefault(feedback_type, {})[role or UNSPECIFIED_ROLE] = aggregate
+
+    types = {}
+    for feedback_type, by_role in by_type.items():
+        types[feedback_type] = rollup(by_role.values(), now)
+        types[feedback_type]["roles"] = {role: rollup([aggregate], now) for role, aggregate in sorted(by_role.items())}
+
+    return {
+        "generated_at": datetime.fromtimestamp(now).isoformat(),
+        "bucket_seconds": {name: resolution for name, _, resolution in ANALYTICS_WINDOWS},
+        "types": types
+    }
@@ -1,70 +1,228 @@
-import json
+import heapq
+import itertools
 import os
+import threading
+import time
 from datetime import datetime
-from collections import defaultdict
+from collections import deque
+from utils.feedback_store import FeedbackStore, FEEDBACK_LOG_FILE
+from utils.feedback_analytics import BUCKET_RESOLUTIONS, BUCKET_RETENTION, build_analytics
+from utils.feedback_themes import cluster_feedback
+
+FEEDBACK_TYPES = ('code_analysis', 'repo_analysis', 'diagram')
+# Most recent feedback items kept for each (type, role)
+RECENT_FEEDBACK_LIMIT = 5
+# Most recent negative feedback texts kept for each (type, role)
+NEGATIVE_THEMES_LIMIT = 20
+# Most recent negative feedback items clustered into themes for each (type, role)
+THEME_SAMPLE_LIMIT = int(os.getenv("THEME_SAMPLE_LIMIT", "500"))
+# Seconds between background theme recomputations
+FEEDBACK_THEMES_INTERVAL = float(os.getenv("FEEDBACK_THEMES_INTERVAL", "60"))
+# Themes added to a prompt
+PROMPT_THEMES_LIMIT = 3
+# Ratings at or below this count as negative feedback
+NEGATIVE_RATING_THRESHOLD = 3
+
+def entry_time(entry):
+    """Returns an entry's timestamp as seconds since the epoch, or None if it is missing or invalid."""
+    try:
+        return datetime.fromisoformat(entry['timestamp']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+class FeedbackAggregate:
+    """Running statistics for one (type, role), updated in O(1) per entry."""
+
+    def __init__(self):
+        self.count = 0
+        self.rating_sum = 0
+        # Min-heap of (timestamp, sequence, item), so the oldest of the kept items is evicted first
+        self.recent = []
+        # (timestamp, text) of recent negative feedback, the input to theme clustering
+        self.negatives = deque(maxlen=max(THEME_SAMPLE_LIMIT, NEGATIVE_THEMES_LIMIT))
+        # Bumped on every negative entry, so themes are only recomputed when it moved
+        self.negative_version = 0
+        # rating -> count
+        self.histogram = {}
+        # bucket size -> {bucket start (seconds since the epoch) -> [count, rating sum]}
+        self.buckets = {resolution: {} for resolution in BUCKET_RESOLUTIONS}
+        self._sequence = itertools.count()
+        self._summary = None
+
+    def add(self, entry):
+        item = {
+            'rating': entry['rating'],
+            'feedback': entry['feedback_text'],
+            'timestamp': entry['timestamp']
+        }
+        self.count += 1
+        self.rating_sum += entry['rating']
+        heap_item = (item['timestamp'], next(self._sequence), item)
+        if len(self.recent) < RECENT_FEEDBACK_LIMIT:
+            heapq.heappush(self.recent, heap_item)
+        else:
+            heapq.heappushpop(self.recent, heap_item)
+        if entry['rating'] <= NEGATIVE_RATING_THRESHOLD:
+            self.negatives.append((entry_time(entry), entry['feedback_text']))
+            self.negative_version += 1
+        self.histogram[entry['rating']] = self.histogram.get(entry['rating'], 0) + 1
+        self._add_to_bucket(entry)
+        self._summary = None
+
+    def _add_to_bucket(self, entry):
+        timestamp = entry_time(entry)
+        if timestamp is None:
+            return
+        for resolution, buckets in self.buckets.items():
+            start = int(timestamp // resolution) * resolution
+            bucket = buckets.get(start)
+            if bucket is None:
+                bucket = buckets[start] = [0, 0]
+                # Expire old buckets only when a new one opens, keeping adds O(1) amortized
+                retention = BUCKET_RETENTION[resolution]
+                if len(buckets) > retention:
+                    cutoff = max(buckets) - retention * resolution
+                    for old in [s for s in buckets if s <= cutoff]:
+                        del buckets[old]
+            bucket[0] += 1
+            bucket[1] += entry['rating']
+
+    def window(self, start, end, resolution):
+        """Returns (count, rating sum) over the buckets of the given size starting in [start, end)."""
+        count = rating_sum = 0
+        for bucket_start, (bucket_count, bucket_sum) in self.buckets[resolution].items():
+            if start <= bucket_start < end:
+                count += bucket_count
+                rating_sum += bucket_sum
+        return count, rating_sum
+
+    def summary(self):
+        """The improvements dict for this (type, role), rebuilt only after a change."""
+        if self._summary is None:
+            self._summary = {
+                'average_rating': self.rating_sum / self.count if self.count else 0,
+                'recent_feedback': [item for _, _, item in sorted(self.recent, reverse=True)],
+                # Newest first, as that is what update_instructions shows
+                'negative_themes': [
+                    text for _, text in itertools.islice(reversed(self.negatives), NEGATIVE_THEMES_LIMIT)
+                ],
+                'total_feedback': self.count
+            }
+        return self._summary
 
 class FeedbackLearner:
-    def __init__(self, feedback_file='feedback_data.json'):
+    def __init__(self, feedback_file=FEEDBACK_LOG_FILE):
         self.feedback_file = feedback_file
-        self.feedback_data = self._load_feedback()
-        self.role_improvements = self._analyze_feedback()
+        self.store = FeedbackStore(feedback_file)
+        self._lock = threading.Lock()
+        # (feedback type, role) -> FeedbackAggregate; role is None for entries without one
+        self.aggregates = {}
+        # How far into the log the aggregates reach
+        self._position = None
+        # (feedback type, role) -> ranked themes, replaced whole by update_themes
+        self.themes = {}
+        # (feedback type, role) -> negative_version the themes were computed from
+        self._theme_versions = {}
+        self._theme_thread = None
+        self.refresh()
 
-    def _load_feedback(self):
-        if os.path.exists(self.feedback_file):
-            with open(self.feedback_file, 'r') as f:
-                return json.load(f)
-        return {
-            'code_analysis': [],
-            'repo_analysis': [],
-            'diagram': []
-        }
+    def refresh(self):
+        """
+        Folds in entries written since the last refresh, by this or any other process.
+        Costs a single stat when nothing changed; the aggregates are only rebuilt from
+        scratch on first load or after the log was cleared.
+        """
+        if not self.store.has_changed(self._position):
+            return
+        with self._lock:
+            entries, position, reset = self.store.read(self._position)
+            if reset:
+                self.aggregates = {}
+                self.themes = {}
+                self._theme_versions = {}
+            for entry in entries:
+                feedback_type = entry.pop('type', None)
+                if feedback_type:
+                    self._add_entry(feedback_type, entry)
+            self._position = position
 
-    def _analyze_feedback(self):
-        improvements = defaultdict(dict)
-        
-        # Analyze feedback for each role
-        for feedback_type, entries in self.feedback_data.items():
-            if feedback_type == 'code_analysis':
-                role_feedback = defaultdict(list)
-                
-                # Group feedback by role
-                for entry in entries:
-                    role = entry.get('additional_data', {}).get('role')
-                    if role:
-                        role_feedback[role].append({
-                            'rating': entry['rating'],
-                            'feedback': entry['feedback_text'],
-                            'timestamp': entry['timestamp']
-                        })
-                
-                # Analyze each role's feedback
-                for role, feedbacks in role_feedback.items():
-                    if feedbacks:
-                        # Calculate average rating
-                        avg_rating = sum(f['rating'] for f in feedbacks) / len(feedbacks)
-                        
-                        # Get recent feedback (last 5)
-                        recent_feedback = sorted(feedbacks, 
-                                              key=lambda x: x['timestamp'], 
-                                              reverse=True)[:5]
-                        
-                        # Extract common themes from negative feedback
-                        negative_themes = []
-                        for f in feedbacks:
-                            if f['rating'] <= 3:
-                                negative_themes.append(f['feedback'])
-                        
-                        improvements[role] = {
-                            'average_rating': avg_rating,
-                            'recent_feedback': recent_feedback,
-                            'negative_themes': negative_themes,
-                            'total_feedback': len(feedbacks)
-                        }
-        
-        return improvements
+    def _add_entry(self, feedback_type, entry):
+        role = (entry.get('additional_data') or {}).get('role')
+        key = (feedback_type, role)
+        if key not in self.aggregates:
+            self.aggregates[key] = FeedbackAggregate()
+        self.aggregates[key].add(entry)
 
     def get_role_improvements(self, role):
-        return self.role_improvements.get(role, {})
+        self.refresh()
+        aggregate = self.aggregates.get(('code_analysis', role))
+        return aggregate.summary() if aggregate else {}
+
+    def get_role_themes(self, role):
+        """The precomputed negative feedback themes for a role; never clusters on the caller's thread."""
+        return self.themes.get(('code_analysis', role), [])
+
+    def update_themes(self):
+        """
+        Re-clusters the negative feedback of every (type, role) that received some since
+        its themes were last computed. Clustering runs outside the lock, on a snapshot.
+        """
+        self.refresh()
+        with self._lock:
+            stale = [
+                (key, aggregate, aggregate.negative_version, list(aggregate.negatives))
+                for key, aggregate in self.aggregates.items()
+                if aggregate.negatives and self._theme_versions.get(key) != aggregate.negative_version
+            ]
+        for key, aggregate, version, negatives in stale:
+            themes = cluster_feedback(negatives)
+            with self._lock:
+                # Skip results for aggregates dropped by a clear while clustering
+                if self.aggregates.get(key) is aggregate:
+                    self.themes = {**self.themes, key: themes}
+                    self._theme_versions[key] = version
+
+    def start_theme_worker(self, interval=FEEDBACK_THEMES_INTERVAL):
+        """Starts a daemon thread that keeps the themes up to date."""
+        with self._lock:
+            if self._theme_thread is not None:
+                return
+            self._theme_thread = threading.Thread(
+                target=self._theme_worker, args=(interval,), name="feedback-themes", daemon=True
+            )
+        self._theme_thread.start()
+
+    def _theme_worker(self, interval):
+        while True:
+            try:
+                self.update_themes()
+            except Exception as e:
+                print(f"Error updating feedback themes: {str(e)}")
+            time.sleep(interval)
+
+    def get_type_stats(self, feedback_type):
+        """Totals, average and most recent feedback across every role of a feedback type."""
+        self.refresh()
+        with self._lock:
+            aggregates = [a for (t, _), a in self.aggregates.items() if t == feedback_type]
+            total = sum(a.count for a in aggregates)
+            rating_sum = sum(a.rating_sum for a in aggregates)
+            recent = heapq.nlargest(
+                RECENT_FEEDBACK_LIMIT,
+                (heap_item for a in aggregates for heap_item in a.recent),
+                key=lambda heap_item: heap_item[0]
+            )
+        return {
+            'total_feedback': total,
+            'average_rating': rating_sum / total if total else 0,
+            'recent_feedback': [item for _, _, item in recent]
+        }
+
+    def get_analytics(self, now=None):
+        """Per-type and per-role histograms, rolling averages and trends from the bucketed rollups."""
+        self.refresh()
+        with self._lock:
+            return build_analytics(self.aggregates, FEEDBACK_TYPES, now)
 
     def update_instructions(self, base_instructions, role):
         improvements = self.get_role_improvements(role)
@@ -73,7 +231,11 @@ class FeedbackLearner:
 
         # Get recent feedback themes
         recent_themes = [f['feedback'] for f in improvements.get('recent_feedback', [])]
-        negative_themes = improvements.get('negative_themes', [])
+        # Clustered themes once the background worker has computed them, raw texts until then
+        negative_themes = [
+            f"{theme['theme']} (reported {theme['count']} times)" if theme['count'] > 1 else theme['theme']
+            for theme in self.get_role_themes(role)
+        ] or improvements.get('negative_themes', [])
         
         # Create improvement instructions
         improvement_instructions = []
@@ -81,7 +243,7 @@ class FeedbackLearner:
         if negative_themes:
             improvement_instructions.append(
                 "Based on previous feedback, please avoid these issues:\n" +
-                "\n".join(f"- {theme}" for theme in negative_themes[:3])
+                "\n".join(f"- {theme}" for theme in negative_themes[:PROMPT_THEMES_LIMIT])
             )
         
         if recent_themes:
@@ -104,10 +266,25 @@ class FeedbackLearner:
             'additional_data': additional_data
         }
         
-        self.feedback_data[feedback_type].append(feedback_entry)
-        
-        with open(self.feedback_file, 'w') as f:
-            json.dump(self.feedback_data, f, indent=4)
+        # Append to the log instead of rewriting the whole history
+        self.store.append(feedback_type, feedback_entry)
         
-        # Update improvements after saving new feedback
-        self.role_improvements = self._analyze_feedback() 
\ No newline at end of file
+        # Fold the new entry, and any written by other workers, into the running aggregates
+        self.refresh()
+
+    def clear(self):
+        self.store.clear()
+        self.refresh()
+
+_feedback_learner = None
+_feedback_learner_lock = threading.Lock()
+
+def get_feedback_learner():
+    """Returns the process-wide feedback learner, shared by every blueprint."""
+    global _feedback_learner
+    with _feedback_learner_lock:
+        if _feedback_learner is None:
+            _feedback_learner = FeedbackLearner()
+            _feedback_learner.start_theme_worker()
+        return _feedback_learner
+ 
\ No newline at end of file
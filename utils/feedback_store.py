@@ -0,0 +1,119 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+# Append-only log of feedback entries, one JSON object per line
+FEEDBACK_LOG_FILE = os.getenv("FEEDBACK_LOG_FILE", "feedback_data.jsonl")
+# Feedback file written by earlier versions, imported once when the log is first created
+LEGACY_FEEDBACK_FILE = os.getenv("LEGACY_FEEDBACK_FILE", "feedback_data.json")
+
+# Where a reader is in the log: (inode, byte offset). Clearing swaps in a new file,
+# so a changed inode means the reader has to start over.
+LogPosition = Tuple[int, int]
+
+class FeedbackStore:
+    """
+    Append-only JSONL feedback log. Each submission is a single appended line, so its
+    cost does not grow with the history. Writers hold a flock on a sibling file, which
+    serializes appends, migration and clearing across threads and gunicorn workers.
+    """
+
+    def __init__(self, path: str = FEEDBACK_LOG_FILE, legacy_path: str = LEGACY_FEEDBACK_FILE):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._migrate()
+
+    @contextmanager
+    def _locked(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _replace(self, lines: List[str]) -> None:
+        """Atomically swaps in a new log holding exactly these lines."""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _migrate(self) -> None:
+        """Imports the legacy JSON file the first time the log is created."""
+        if os.path.exists(self.path):
+            return
+        with self._locked():
+            # Another worker may have migrated while this one waited for the lock
+            if os.path.exists(self.path):
+                return
+            lines = []
+            if os.path.exists(self.legacy_path):
+                try:
+                    with open(self.legacy_path, "r", encoding="utf-8") as f:
+                        legacy = json.load(f)
+                    for feedback_type, entries in legacy.items():
+                        lines.extend(json.dumps({"type": feedback_type, **entry}) + "\n" for entry in entries)
+                    lines.sort(key=lambda line: json.loads(line).get("timestamp", ""))
+                except (OSError, ValueError, AttributeError) as e:
+                    print(f"Error migrating {self.legacy_path}: {str(e)}")
+                    lines = []
+            self._replace(lines)
+
+    def append(self, feedback_type: str, entry: Dict[str, Any]) -> None:
+        """Appends one entry with a single write, so readers never see it half written."""
+        line = (json.dumps({"type": feedback_type, **entry}) + "\n").encode("utf-8")
+        with self._locked():
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def has_changed(self, position: Optional[LogPosition]) -> bool:
+        """Cheap check, a single stat, for whether anything was written since position."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return position is not None
+        return position is None or (stat.st_ino, stat.st_size) != position
+
+    def read(self, position: Optional[LogPosition] = None) -> Tuple[List[Dict[str, Any]], Optional[LogPosition], bool]:
+        """
+        Returns the entries written since position, the position to resume from, and
+        whether the reader must discard what it has (the log was cleared or is new to
+        it). A trailing line without its newline is still being written and is left for
+        the next read.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                reset = position is None or position[0] != inode or os.fstat(f.fileno()).st_size < position[1]
+                offset = 0 if reset else position[1]
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], None, position is not None
+
+        end = data.rfind(b"\n") + 1
+        entries = []
+        for raw in data[:end].splitlines():
+            if not raw.strip():
+                continue
+            try:
+                entries.append(json.loads(raw))
+            except ValueError:
+                print(f"Skipping malformed feedback line in {self.path}")
+        return entries, (inode, offset + end), reset
+
+    def clear(self) -> None:
+        """Empties the log. The file is kept, so the legacy import does not run again."""
+        with self._locked():
+            self._replace([])
@@ -0,0 +1,142 @@
+"""
+Groups similar negative feedback into themes for prompt adaptation.
+
+Each text becomes a sparse TF-IDF vector over its words and the character trigrams of
+those words, so misspelled variants of a complaint still land together. Texts join
+the most similar cluster by cosine similarity against the cluster centroids, scored
+for all clusters at once via an inverted index, or start a new cluster. Clusters are
+ranked by frequency weighted by recency.
+
+The learner recomputes themes on a background thread; inspect them offline with:
+
+    python -m utils.feedback_themes
+"""
+import functools
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Cosine similarity to a cluster centroid needed to join that cluster
+THEME_SIMILARITY_THRESHOLD = float(os.getenv("THEME_SIMILARITY_THRESHOLD", "0.3"))
+# Days after which a piece of feedback counts half as much when ranking themes
+THEME_HALF_LIFE_DAYS = float(os.getenv("THEME_HALF_LIFE_DAYS", "14"))
+# Distinct example texts kept per theme
+THEME_EXAMPLES = 3
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "i", "if", "in", "is",
+    "it", "its", "me", "my", "of", "on", "or", "so", "that", "the", "this", "to", "was", "we",
+    "with", "you", "your", "it's", "i'm", "very", "just", "please", "would", "could",
+}
+
+@functools.lru_cache(maxsize=8192)
+def text_features(text: str) -> Tuple[Tuple[str, int], ...]:
+    """Returns the term counts of a text: its words plus the character trigrams of each word."""
+    counts: Counter = Counter()
+    for word in WORD_PATTERN.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        counts[word] += 1
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            counts["#" + padded[i:i + 3]] += 1
+    return tuple(counts.items())
+
+def _tfidf_vectors(texts: List[str]) -> List[Dict[str, float]]:
+    features = [dict(text_features(text)) for text in texts]
+    document_frequency: Counter = Counter()
+    for terms in features:
+        document_frequency.update(terms.keys())
+    count = len(texts)
+
+    vectors = []
+    for terms in features:
+        vector = {
+            term: (1 + math.log(tf)) * math.log((1 + count) / (1 + document_frequency[term]) + 1)
+            for term, tf in terms.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors.append({term: weight / norm for term, weight in vector.items()})
+    return vectors
+
+def cluster_feedback(items: List[Tuple[Optional[float], str]], now: Optional[float] = None) -> List[Dict]:
+    """
+    Clusters (timestamp, text) feedback items and returns the themes, most significant
+    first. A theme's score is the sum of its members' recency weights.
+    """
+    now = time.time() if now is None else now
+    items = [(timestamp, text.strip()) for timestamp, text in items if text and text.strip()]
+    if not items:
+        return []
+    vectors = _tfidf_vectors([text for _, text in items])
+
+    # Cluster centroids (unnormalized sums), their norms, and term -> {cluster: weight}
+    centroids: List[Dict[str, float]] = []
+    norms: List[float] = []
+    postings: Dict[str, Dict[int, float]] = {}
+    members: List[List[int]] = []
+    for position, vector in enumerate(vectors):
+        scores: Dict[int, float] = {}
+        for term, weight in vector.items():
+            for cluster, centroid_weight in postings.get(term, {}).items():
+                scores[cluster] = scores.get(cluster, 0.0) + weight * centroid_weight
+        best, best_score = None, THEME_SIMILARITY_THRESHOLD
+        for cluster, score in scores.items():
+            similarity = score / norms[cluster]
+            if similarity >= best_score:
+                best, best_score = cluster, similarity
+        if best is None:
+            best = len(centroids)
+            centroids.append({})
+            norms.append(0.0)
+            members.append([])
+        centroid = centroids[best]
+        for term, weight in vector.items():
+            centroid[term] = centroid.get(term, 0.0) + weight
+            postings.setdefault(term, {})[best] = centroid[term]
+        norms[best] = math.sqrt(sum(weight * weight for weight in centroid.values())) or 1.0
+        members[best].append(position)
+
+    half_life = THEME_HALF_LIFE_DAYS * 86400
+    themes = []
+    for cluster, positions in enumerate(members):
+        centroid, norm = centroids[cluster], norms[cluster]
+
+        def centrality(position: int) -> float:
+            return sum(weight * centroid.get(term, 0.0) for term, weight in vectors[position].items()) / norm
+
+        # The most central member represents the theme; shorter texts win ties
+        ranked = sorted(positions, key=lambda p: (-round(centrality(p), 3), len(items[p][1])))
+        timestamps = [items[p][0] for p in positions if items[p][0] is not None]
+        score = sum(
+            0.5 ** (max(0.0, now - items[p][0]) / half_life) if items[p][0] is not None else 0.5
+            for p in positions
+        )
+        themes.append({
+            "theme": items[ranked[0]][1],
+            "count": len(positions),
+            "score": score,
+            "last_seen": datetime.fromtimestamp(max(timestamps)).isoformat() if timestamps else None,
+            "examples": list(dict.fromkeys(items[p][1] for p in ranked))[:THEME_EXAMPLES]
+        })
+
+    themes.sort(key=lambda theme: theme["score"], reverse=True)
+    return themes
+
+if __name__ == "__main__":
+    from utils.feedback_learner import FeedbackLearner
+
+    learner = FeedbackLearner(sys.argv[1]) if len(sys.argv) > 1 else FeedbackLearner()
+    start = time.perf_counter()
+    learner.update_themes()
+    for (feedback_type, role), themes in sorted(learner.themes.items(), key=lambda item: str(item[0])):
+        print(f"{feedback_type} / {role or 'unspecified'}:")
+        for theme in themes:
+            print(f"  [{theme['count']:>3} | {theme['score']:.2f}] {theme['theme']}")
+    print(f"Clustered in {(time.perf_counter() - start) * 1000:.1f} ms")
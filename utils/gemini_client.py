@@ -1,5 +1,34 @@
 import google.generativeai as genai
 import os
+from utils.llm_cache import cached_generate
+
+MODEL_NAME = 'gemini-pro'
+
+class CachedResponse:
+    """Minimal stand-in for a Gemini response served from the cache."""
+    def __init__(self, text):
+        self.text = text
+
+class CachedGenerativeModel:
+    """
+    Wraps a GenerativeModel so plain-text prompts are answered from the shared LLM cache.
+    """
+    def __init__(self, model, model_name):
+        self.model = model
+        self.model_name = model_name
+
+    def generate_content(self, prompt, **kwargs):
+        if not isinstance(prompt, str) or kwargs:
+            return self.model.generate_content(prompt, **kwargs)
+        text = cached_generate(
+            self.model_name,
+            prompt,
+            lambda p: self.model.generate_content(p).text
+        )
+        return CachedResponse(text)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
 
 def get_gemini_client():
     """
@@ -9,6 +38,6 @@ def get_gemini_client():
     genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
     
     # Get the model
-    model = genai.GenerativeModel('gemini-pro')
+    model = genai.GenerativeModel(MODEL_NAME)
     
-    return model 
\ No newline at end of file
+    return CachedGenerativeModel(model, MODEL_NAME)
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from typing import Any, Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default (connect, read) timeouts in seconds for outbound calls
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+# Retries on connection errors and 429/5xx responses, with exponential backoff. Read
+# errors are never retried: the request may already have been processed, and a POST
+# that times out must fail on its first attempt rather than run several times over.
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+# Number of hosts with a cached connection pool, and connections kept alive per host
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "10"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+_metrics: Dict[str, Dict[str, Any]] = {}
+_metrics_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Returns the process-wide session, whose keep-alive connections are reused across calls."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_MAX_RETRIES,
+                read=False,
+                backoff_factor=HTTP_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=None,
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_HOSTS,
+                pool_maxsize=HTTP_POOL_SIZE,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def _record(host: str, elapsed: float, failed: bool) -> None:
+    with _metrics_lock:
+        stats = _metrics.setdefault(host, {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        elapsed_ms = elapsed * 1000
+        stats["requests"] += 1
+        stats["errors"] += int(failed)
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Sends a request through the shared session, applying the default timeouts and recording latency."""
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    host = urlsplit(url).netloc
+    start = time.monotonic()
+    failed = True
+    try:
+        response = get_session().request(method, url, **kwargs)
+        failed = response.status_code >= 400
+        return response
+    finally:
+        _record(host, time.monotonic() - start, failed)
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+def get_latency_metrics() -> Dict[str, Dict[str, Any]]:
+    """Returns request count, error count and average/max latency in milliseconds per host."""
+    with _metrics_lock:
+        return {
+            host: {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total_ms"] / stats["requests"], 2),
+                "max_ms": round(stats["max_ms"], 2)
+            }
+            for host, stats in _metrics.items()
+        }
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from utils.cache import CACHE_DIR
+
+# Background analyses run at the same time in each web worker process
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "2"))
+# Jobs queued or running in a process before new submissions are rejected
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "20"))
+# Seconds finished jobs are kept for retrieval
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+# Seconds between heartbeats from each process that owns jobs
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+# A queued or running job whose owning process has not sent a heartbeat for this long is
+# treated as lost (the process died). Time spent waiting in the queue or in a single
+# slow stage does not count, as long as the process is alive.
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "120"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+# A job function receives its params and a progress(stage, percent) callback and
+# returns the response body and HTTP status code
+JobFunction = Callable[[Dict[str, Any], Callable[[str, int], None]], Tuple[Dict[str, Any], int]]
+
+def no_progress(stage: str, percent: int) -> None:
+    """Progress callback for job functions called directly rather than through the queue."""
+
+class JobQueueFull(Exception):
+    """Raised when a process already has JOB_MAX_PENDING jobs queued or running."""
+
+class JobQueue:
+    """
+    Runs long analyses on a background thread pool. Job state lives in sqlite, so any
+    web worker can report on a job, and identical jobs already in flight are shared
+    instead of being run twice.
+    """
+
+    def __init__(self, db_path: str, max_workers: int = JOB_MAX_WORKERS, max_pending: int = JOB_MAX_PENDING):
+        self.db_path = db_path
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Identifies this process as the owner of the jobs it runs
+        self.worker_id = uuid.uuid4().hex
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, dedup_key TEXT NOT NULL, "
+                "status TEXT NOT NULL, stage TEXT, progress INTEGER NOT NULL DEFAULT 0, "
+                "result TEXT, http_status INTEGER, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)")
+            if "worker_id" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker_id TEXT")
+            conn.execute("CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)")
+        self._heartbeat()
+        threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+
+    def _heartbeat(self) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (id, heartbeat_at) VALUES (?, ?)",
+                (self.worker_id, time.time())
+            )
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                self._heartbeat()
+            except sqlite3.Error as e:
+                print(f"Error recording job worker heartbeat: {str(e)}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def submit(self, kind: str, params: Dict[str, Any], func: JobFunction) -> Tuple[str, bool]:
+        """
+        Queues func(params, progress). Returns (job_id, created); created is False when an
+        identical job was already queued or running and its id is returned instead.
+        """
+        dedup_key = hashlib.sha256(f"{kind}:{json.dumps(params, sort_keys=True)}".encode("utf-8")).hexdigest()
+        now = time.time()
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                    (*FINISHED_STATUSES, now - JOB_RESULT_TTL)
+                )
+                conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - JOB_RESULT_TTL,))
+                # Only jobs whose owning process is still alive are shared, as in get()
+                existing = conn.execute(
+                    "SELECT jobs.id FROM jobs JOIN workers ON workers.id = jobs.worker_id "
+                    "WHERE jobs.dedup_key = ? AND jobs.status IN (?, ?) AND workers.heartbeat_at >= ? "
+                    "ORDER BY jobs.created_at DESC LIMIT 1",
+                    (dedup_key, QUEUED, RUNNING, now - JOB_STALE_AFTER)
+                ).fetchone()
+                if existing is not None:
+                    return existing["id"], False
+
+                if self._pending >= self.max_pending:
+                    raise JobQueueFull(f"Too many analyses in progress ({self.max_pending}). Please try again later.")
+
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, dedup_key, status, stage, worker_id, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, dedup_key, QUEUED, "Waiting for a free worker", self.worker_id, now, now)
+                )
+            self._pending += 1
+
+        self.executor.submit(self._run, job_id, params, func)
+        return job_id, True
+
+    def _run(self, job_id: str, params: Dict[str, Any], func: JobFunction) -> None:
+        def progress(stage: str, percent: int) -> None:
+            self._update(job_id, stage=stage, progress=max(0, min(100, int(percent))))
+
+        try:
+            self._update(job_id, status=RUNNING, stage="Starting")
+            result, http_status = func(params, progress)
+            self._update(
+                job_id,
+                status=SUCCEEDED if http_status < 400 else FAILED,
+                stage="Finished",
+                progress=100,
+                result=json.dumps(result),
+                http_status=http_status,
+                error=result.get("error") if isinstance(result, dict) else None
+            )
+        except Exception as e:
+            print(f"Error running job {job_id}: {str(e)}")
+            self._update(job_id, status=FAILED, stage="Failed", error=str(e), http_status=500)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the job's status, progress and, once finished, its result."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT jobs.*, workers.heartbeat_at FROM jobs "
+                "LEFT JOIN workers ON workers.id = jobs.worker_id WHERE jobs.id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "progress": row["progress"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+        # Staleness follows the owning process's heartbeat, not the job's last update
+        heartbeat_at = row["heartbeat_at"]
+        owner_alive = heartbeat_at is not None and time.time() - heartbeat_at <= JOB_STALE_AFTER
+        if row["status"] in (QUEUED, RUNNING) and not owner_alive:
+            job["status"] = FAILED
+            job["error"] = "The process running the job stopped and the job was abandoned"
+        if row["status"] in FINISHED_STATUSES:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+            job["http_status"] = row["http_status"]
+            job["error"] = row["error"]
+        return job
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Returns the process-wide job queue."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(os.path.join(CACHE_DIR, "jobs.sqlite3"))
+        return _job_queue
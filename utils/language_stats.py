@@ -0,0 +1,183 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from utils.cache import CACHE_DIR, SqliteCache
+
+if TYPE_CHECKING:
+    from utils.repo_scanner import RepoIndex
+
+# Threads used to stat and sniff files
+LANGUAGE_STATS_WORKERS = int(os.getenv("LANGUAGE_STATS_WORKERS", "8"))
+# Bump when language detection or the vendored/generated rules change so cached
+# per-commit statistics are recomputed
+LANGUAGE_STATS_VERSION = 2
+
+# Programming and markup languages by file extension. Data and prose formats
+# (JSON, YAML, Markdown, ...) are left out, as GitHub does.
+EXTENSION_LANGUAGES = {
+    ".py": "Python", ".pyw": "Python", ".pyi": "Python", ".ipynb": "Jupyter Notebook",
+    ".js": "JavaScript", ".mjs": "JavaScript", ".cjs": "JavaScript", ".jsx": "JavaScript",
+    ".ts": "TypeScript", ".tsx": "TypeScript", ".mts": "TypeScript", ".cts": "TypeScript",
+    ".vue": "Vue", ".svelte": "Svelte",
+    ".html": "HTML", ".htm": "HTML", ".css": "CSS", ".scss": "SCSS", ".sass": "Sass",
+    ".less": "Less", ".styl": "Stylus",
+    ".java": "Java", ".kt": "Kotlin", ".kts": "Kotlin", ".scala": "Scala", ".groovy": "Groovy",
+    ".go": "Go", ".rs": "Rust", ".rb": "Ruby", ".php": "PHP", ".swift": "Swift",
+    ".c": "C", ".h": "C", ".cc": "C++", ".cpp": "C++", ".cxx": "C++", ".hpp": "C++", ".hh": "C++",
+    ".cs": "C#", ".fs": "F#", ".m": "Objective-C", ".mm": "Objective-C++",
+    ".dart": "Dart", ".lua": "Lua", ".pl": "Perl", ".pm": "Perl", ".r": "R",
+    ".jl": "Julia", ".ex": "Elixir", ".exs": "Elixir", ".erl": "Erlang", ".hs": "Haskell",
+    ".clj": "Clojure", ".elm": "Elm", ".ml": "OCaml", ".zig": "Zig", ".nim": "Nim",
+    ".sh": "Shell", ".bash": "Shell", ".zsh": "Shell", ".ps1": "PowerShell", ".bat": "Batchfile",
+    ".sql": "SQL", ".pls": "PLSQL", ".proto": "Protocol Buffer",
+    ".tf": "HCL", ".hcl": "HCL", ".nix": "Nix", ".cmake": "CMake",
+    ".ejs": "EJS", ".hbs": "Handlebars", ".jinja": "Jinja", ".j2": "Jinja",
+    ".tex": "TeX", ".sol": "Solidity", ".asm": "Assembly", ".s": "Assembly",
+}
+
+# Languages of files recognised by their full name
+FILENAME_LANGUAGES = {
+    "Dockerfile": "Dockerfile", "Containerfile": "Dockerfile",
+    "Makefile": "Makefile", "makefile": "Makefile", "GNUmakefile": "Makefile",
+    "CMakeLists.txt": "CMake", "Rakefile": "Ruby", "Gemfile": "Ruby", "Jenkinsfile": "Groovy",
+}
+
+# Languages of extensionless scripts by shebang interpreter
+SHEBANG_LANGUAGES = {
+    "python": "Python", "python2": "Python", "python3": "Python",
+    "node": "JavaScript", "nodejs": "JavaScript", "deno": "TypeScript", "ts-node": "TypeScript",
+    "sh": "Shell", "bash": "Shell", "zsh": "Shell", "dash": "Shell", "ksh": "Shell",
+    "ruby": "Ruby", "perl": "Perl", "php": "PHP", "lua": "Lua", "Rscript": "R",
+}
+
+# Directories that hold third-party or build output rather than project code
+VENDORED_DIRS = {
+    ".git", "node_modules", "bower_components", "vendor", "vendors", "third_party", "third-party",
+    "dist", "build", "out", "target", "coverage", ".venv", "venv", "env", "site-packages",
+    "__pycache__", ".tox", ".next", ".nuxt", "Pods", "Carthage",
+}
+
+# Vendored or generated files that live alongside project code
+GENERATED_FILE_PATTERNS = re.compile(
+    r"(\.min\.(js|css)$|-min\.(js|css)$|\.bundle\.js$|\.map$"
+    r"|(^|/)jquery[^/]*\.js$|(^|/)bootstrap[^/]*\.(js|css)$"
+    r"|_pb2(_grpc)?\.py$|\.pb\.(go|cc|h)$|\.generated\.\w+$|\.g\.dart$"
+    r"|(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|Cargo\.lock)$)"
+)
+
+_stats_cache = None
+_stats_cache_lock = threading.Lock()
+
+def get_stats_cache() -> SqliteCache:
+    """Returns the process-wide language statistics cache."""
+    global _stats_cache
+    with _stats_cache_lock:
+        if _stats_cache is None:
+            _stats_cache = SqliteCache(
+                os.path.join(CACHE_DIR, "language_stats.sqlite3"),
+                table="language_stats",
+                max_entries=5000
+            )
+        return _stats_cache
+
+def is_vendored_path(rel_path: str) -> bool:
+    """Returns True for vendored, generated or build output paths."""
+    parts = rel_path.replace(os.sep, "/").split("/")
+    if any(part in VENDORED_DIRS for part in parts[:-1]):
+        return True
+    return bool(GENERATED_FILE_PATTERNS.search("/".join(parts)))
+
+def language_from_shebang(first_line: bytes) -> Optional[str]:
+    """Returns the language named by a '#!' line, if any."""
+    if not first_line.startswith(b"#!"):
+        return None
+    words = first_line[2:].decode("utf-8", errors="ignore").split()
+    if not words:
+        return None
+    interpreter = os.path.basename(words[0])
+    if interpreter == "env" and len(words) > 1:
+        interpreter = next((w for w in words[1:] if not w.startswith("-")), "")
+    interpreter = re.sub(r"[\d.]+$", "", interpreter) or interpreter
+    return SHEBANG_LANGUAGES.get(interpreter)
+
+def detect_language(path: str, read_shebang: bool = True) -> Optional[str]:
+    """Detects a file's language from its name, extension or shebang line."""
+    name = os.path.basename(path)
+    if name in FILENAME_LANGUAGES:
+        return FILENAME_LANGUAGES[name]
+    ext = os.path.splitext(name)[1].lower()
+    if ext:
+        return EXTENSION_LANGUAGES.get(ext)
+    if not read_shebang:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return language_from_shebang(f.readline(128))
+    except OSError:
+        return None
+
+def _measure(path: str) -> Tuple[Optional[str], int]:
+    language = detect_language(path)
+    if language is None:
+        return None, 0
+    try:
+        return language, os.lstat(path).st_size
+    except OSError:
+        return None, 0
+
+def _count_indexed_bytes(index: "RepoIndex") -> Dict[str, int]:
+    """Counts bytes per language from an existing repository index, without another walk."""
+    language_bytes: Dict[str, int] = {}
+    unknown = []
+    for entry in index.files:
+        if entry.is_vendored or entry.generated:
+            continue
+        if entry.language:
+            if entry.size:
+                language_bytes[entry.language] = language_bytes.get(entry.language, 0) + entry.size
+        elif not entry.ext:
+            # Only extensionless files can still be identified, by their shebang line
+            unknown.append(entry.abs_path)
+
+    with ThreadPoolExecutor(max_workers=LANGUAGE_STATS_WORKERS) as executor:
+        for language, size in executor.map(_measure, unknown, chunksize=64):
+            if language and size:
+                language_bytes[language] = language_bytes.get(language, 0) + size
+    return language_bytes
+
+def compute_language_bytes(repo_path: str, index: Optional["RepoIndex"] = None) -> Dict[str, int]:
+    """
+    Returns the number of bytes per language in a checkout. Without an index one is
+    built, so .gitignore and the linguist attributes apply either way.
+    """
+    if index is None:
+        # Imported here because repo_scanner uses this module's language detection
+        from utils.repo_scanner import scan_repository
+        index = scan_repository(repo_path)
+    return _count_indexed_bytes(index)
+
+def compute_language_stats(repo_path: str, commit_sha: Optional[str] = None,
+                           index: Optional["RepoIndex"] = None) -> Dict[str, float]:
+    """
+    Returns the byte-weighted percentage of each language in a checkout, largest first.
+    Results are cached per commit when commit_sha is given. An existing repository
+    index is reused instead of walking the checkout again.
+    """
+    cache_key = f"v{LANGUAGE_STATS_VERSION}:{commit_sha}" if commit_sha else None
+    if cache_key:
+        cached = get_stats_cache().get(cache_key)
+        if cached is not None:
+            return cached
+
+    language_bytes = compute_language_bytes(repo_path, index)
+    total_bytes = sum(language_bytes.values())
+    stats = {
+        lang: (size / total_bytes) * 100
+        for lang, size in sorted(language_bytes.items(), key=lambda item: item[1], reverse=True)
+    } if total_bytes else {}
+
+    if cache_key:
+        get_stats_cache().set(cache_key, stats)
+    return stats
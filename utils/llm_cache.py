@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+from typing import Callable, Optional
+from utils.cache import CACHE_DIR, LRUCache, SqliteCache, TieredCache
+
+# Seconds a cached LLM response stays valid
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# Maximum number of responses kept in memory and on disk
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "10000"))
+# Set to 0 to bypass the cache entirely
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalizes line endings and trailing whitespace so equivalent prompts share a key."""
+    lines = prompt.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+def make_cache_key(model: str, prompt: str) -> str:
+    """Returns the content-addressed cache key for a model and prompt."""
+    digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+def get_llm_cache() -> TieredCache:
+    """Returns the process-wide LLM response cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TieredCache(
+                LRUCache(max_entries=LLM_CACHE_MEMORY_ENTRIES, ttl=LLM_CACHE_TTL),
+                SqliteCache(
+                    os.path.join(CACHE_DIR, "llm_cache.sqlite3"),
+                    table="llm_responses",
+                    max_entries=LLM_CACHE_DISK_ENTRIES,
+                    ttl=LLM_CACHE_TTL
+                )
+            )
+        return _cache
+
+def get_cached_response(model: str, prompt: str) -> Optional[str]:
+    """Returns the cached response for (model, prompt), or None."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    return get_llm_cache().get(make_cache_key(model, prompt))
+
+def store_response(model: str, prompt: str, response: str) -> None:
+    """Caches a successful, non-empty response for (model, prompt)."""
+    if LLM_CACHE_ENABLED and response:
+        get_llm_cache().set(make_cache_key(model, prompt), response)
+
+def cached_generate(model: str, prompt: str, generate: Callable[[str], str]) -> str:
+    """
+    Returns the cached response for (model, prompt), calling generate on a miss.
+    Only successful, non-empty responses are stored; errors propagate to the caller.
+    """
+    cached = get_cached_response(model, prompt)
+    if cached is not None:
+        return cached
+
+    response = generate(prompt)
+    store_response(model, prompt, response)
+    return response
@@ -0,0 +1,194 @@
+"""
+Path rules applied while scanning a repository.
+
+.gitignore files (plus .git/info/exclude) decide which paths are skipped altogether,
+and linguist-vendored / linguist-generated markers in .gitattributes flag files the
+way GitHub's language statistics do. Rules from nested files apply below the
+directory that declares them, and the last matching pattern wins.
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+VENDORED = "linguist-vendored"
+GENERATED = "linguist-generated"
+LINGUIST_ATTRIBUTES = (VENDORED, GENERATED)
+
+def glob_to_regex(pattern: str) -> str:
+    """Translates a gitignore-style glob into a regex over '/'-separated paths."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+class PathPattern:
+    """A single gitignore/gitattributes pattern, relative to the directory that declared it."""
+
+    __slots__ = ("base", "regex", "negate", "dir_only", "subtree")
+
+    def __init__(self, base: str, pattern: str):
+        self.base = base.replace(os.sep, "/")
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\"):
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # "dir/**" covers everything below dir, so the whole subtree can be judged at once
+        self.subtree = pattern.endswith("/**")
+        # A pattern with a slash is anchored to its directory; otherwise it matches at any depth
+        anchored = "/" in pattern
+        regex = glob_to_regex(pattern.lstrip("/"))
+        self.regex = re.compile(regex if anchored else f"(?:.*/)?{regex}")
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        rel_path = rel_path.replace(os.sep, "/")
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        return self.regex.fullmatch(rel_path) is not None
+
+def _read_lines(path: str) -> List[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return [line.rstrip() for line in f if line.strip() and not line.startswith("#")]
+    except OSError:
+        return []
+
+def parse_gitignore(path: str, base: str) -> List[PathPattern]:
+    """Reads the patterns in a .gitignore file that lives in the base directory."""
+    patterns = []
+    for line in _read_lines(path):
+        try:
+            patterns.append(PathPattern(base, line))
+        except re.error:
+            print(f"Ignoring invalid pattern in {path}: {line}")
+    return patterns
+
+def parse_attribute_value(token: str) -> Tuple[str, Optional[bool]]:
+    """Parses 'attr', '-attr', '!attr' or 'attr=value' into (name, set/unset/unspecified)."""
+    if token.startswith("-"):
+        return token[1:], False
+    if token.startswith("!"):
+        return token[1:], None
+    if "=" in token:
+        name, value = token.split("=", 1)
+        return name, value.lower() not in ("false", "0", "no", "off")
+    return token, True
+
+def parse_gitattributes(path: str, base: str) -> List[Tuple[PathPattern, Dict[str, Optional[bool]]]]:
+    """Reads the linguist markers in a .gitattributes file that lives in the base directory."""
+    rules = []
+    for line in _read_lines(path):
+        tokens = line.split()
+        # Negative patterns are not allowed in .gitattributes and directory patterns never match
+        if len(tokens) < 2 or tokens[0].startswith("!") or tokens[0].endswith("/"):
+            continue
+        attributes = dict(parse_attribute_value(token) for token in tokens[1:])
+        attributes = {name: value for name, value in attributes.items() if name in LINGUIST_ATTRIBUTES}
+        if not attributes:
+            continue
+        try:
+            rules.append((PathPattern(base, tokens[0]), attributes))
+        except re.error:
+            print(f"Ignoring invalid pattern in {path}: {tokens[0]}")
+    return rules
+
+class PathRules:
+    """The .gitignore and .gitattributes rules in effect for one directory."""
+
+    def __init__(self, ignore: Iterable[PathPattern] = (), attributes: Iterable = ()):
+        self.ignore = list(ignore)
+        self.attributes = list(attributes)
+
+    @classmethod
+    def for_repository(cls, repo_path: str) -> "PathRules":
+        """Rules that apply to the whole checkout before any .gitignore is read."""
+        return cls(parse_gitignore(os.path.join(repo_path, ".git", "info", "exclude"), ""))
+
+    def for_directory(self, rel_dir: str, abs_dir: str, file_names: Iterable[str]) -> "PathRules":
+        """Adds the rules declared in a directory, sharing this object when it declares none."""
+        file_names = set(file_names)
+        ignore = parse_gitignore(os.path.join(abs_dir, ".gitignore"), rel_dir) if ".gitignore" in file_names else []
+        attributes = (parse_gitattributes(os.path.join(abs_dir, ".gitattributes"), rel_dir)
+                      if ".gitattributes" in file_names else [])
+        if not ignore and not attributes:
+            return self
+        return PathRules(self.ignore + ignore, self.attributes + attributes)
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for pattern in self.ignore:
+            if pattern.matches(rel_path, is_dir):
+                ignored = not pattern.negate
+        return ignored
+
+    def file_attributes(self, rel_path: str) -> Dict[str, Optional[bool]]:
+        """Returns the linguist markers set on a file; absent names are unspecified."""
+        values: Dict[str, Optional[bool]] = {}
+        for pattern, attributes in self.attributes:
+            if pattern.matches(rel_path, False):
+                values.update(attributes)
+        return values
+
+    def marks_subtree(self, rel_dir: str) -> bool:
+        """Returns True when a 'dir/**' rule flags everything below rel_dir as vendored or generated."""
+        values: Dict[str, Optional[bool]] = {}
+        probe = f"{rel_dir}/*"
+        for pattern, attributes in self.attributes:
+            if pattern.subtree and pattern.matches(probe, False):
+                values.update(attributes)
+        return any(values.get(name) for name in LINGUIST_ATTRIBUTES)
+
+class TraversalRules:
+    """Decides which indexed files an analysis looks at. Each role can use its own rules."""
+
+    def __init__(self, exclude_dirs: Iterable[str] = (), include_vendored: bool = False,
+                 include_generated: bool = False):
+        self.exclude_dirs = frozenset(exclude_dirs)
+        self.include_vendored = include_vendored
+        self.include_generated = include_generated
+
+    def allows(self, entry, start: str = "") -> bool:
+        """Checks a FileEntry; excluded directory names only count below the start directory."""
+        if not self.include_vendored and entry.is_vendored:
+            return False
+        if not self.include_generated and entry.generated:
+            return False
+        if self.exclude_dirs:
+            rel_path = entry.path[len(start) + 1:] if start else entry.path
+            if any(part in self.exclude_dirs for part in rel_path.split(os.sep)[:-1]):
+                return False
+        return True
+
+DEFAULT_TRAVERSAL_RULES = TraversalRules()
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import threading
+from typing import Dict, Optional
+from utils.cache import CACHE_DIR, SqliteCache
+
+# Number of repository reports kept on disk
+REPO_REPORT_CACHE_ENTRIES = int(os.getenv("REPO_REPORT_CACHE_ENTRIES", "500"))
+# Seconds to wait for `git ls-remote` before giving up on the cache check
+HEAD_CHECK_TIMEOUT = float(os.getenv("HEAD_CHECK_TIMEOUT", "15"))
+
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+def get_report_cache() -> SqliteCache:
+    """Returns the process-wide repository report cache."""
+    global _report_cache
+    with _report_cache_lock:
+        if _report_cache is None:
+            _report_cache = SqliteCache(
+                os.path.join(CACHE_DIR, "repo_reports.sqlite3"),
+                table="repo_reports",
+                max_entries=REPO_REPORT_CACHE_ENTRIES
+            )
+        return _report_cache
+
+def make_report_key(owner: str, repo: str, sha: str) -> str:
+    return f"{owner.lower()}/{repo.lower()}@{sha}"
+
+def get_remote_head_sha(owner: str, repo: str) -> Optional[str]:
+    """Returns the commit SHA of the remote HEAD without cloning, or None if it cannot be resolved."""
+    repo_url = f"https://github.com/{owner}/{repo}.git"
+    try:
+        result = subprocess.run(
+            ["git", "ls-remote", repo_url, "HEAD"],
+            check=True,
+            capture_output=True,
+            timeout=HEAD_CHECK_TIMEOUT,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+        )
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        print(f"Error resolving HEAD for {owner}/{repo}: {str(e)}")
+        return None
+    line = result.stdout.decode().strip()
+    return line.split()[0] if line else None
+
+def get_local_head_sha(repo_path: str) -> Optional[str]:
+    """Returns the commit SHA checked out in a local clone."""
+    try:
+        result = subprocess.run(
+            ["git", "-C", repo_path, "rev-parse", "HEAD"],
+            check=True,
+            capture_output=True
+        )
+    except subprocess.CalledProcessError as e:
+        print(f"Error reading HEAD of {repo_path}: {e.stderr.decode()}")
+        return None
+    return result.stdout.decode().strip() or None
+
+def get_cached_report(owner: str, repo: str, sha: Optional[str]) -> Optional[Dict]:
+    """Returns the stored analysis report for this commit, if any."""
+    if not sha:
+        return None
+    return get_report_cache().get(make_report_key(owner, repo, sha))
+
+def store_report(owner: str, repo: str, sha: Optional[str], report: Dict) -> None:
+    """Stores the analysis report for this commit."""
+    if sha:
+        get_report_cache().set(make_report_key(owner, repo, sha), report)
@@ -0,0 +1,208 @@
+import fcntl
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from utils.cache import CACHE_DIR
+
+# Directory holding the bare repository mirrors
+REPO_MIRROR_DIR = os.getenv("REPO_MIRROR_DIR", os.path.join(CACHE_DIR, "mirrors"))
+# Total disk space the mirrors may use before the least recently used ones are evicted
+REPO_MIRROR_DISK_BUDGET_MB = int(os.getenv("REPO_MIRROR_DISK_BUDGET_MB", "2048"))
+# A mirror fetched less than this many seconds ago is not fetched again
+REPO_MIRROR_FETCH_INTERVAL = float(os.getenv("REPO_MIRROR_FETCH_INTERVAL", "60"))
+
+# Worktree path -> mirror path, for worktrees handed out by this process
+_worktrees: Dict[str, str] = {}
+_worktrees_lock = threading.Lock()
+
+def _git(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["git", *args],
+        check=True,
+        capture_output=True,
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    )
+
+# Characters allowed in the owner and repository names that make up a mirror path
+MIRROR_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+def get_mirror_path(owner: str, repo: str) -> str:
+    """
+    Returns the mirror path for owner/repo. Raises ValueError for names that could
+    point outside REPO_MIRROR_DIR, as both come straight from the request.
+    """
+    for name in (owner, repo):
+        if not MIRROR_NAME_PATTERN.match(name) or name in (".", ".."):
+            raise ValueError(f"Invalid repository name component: {name!r}")
+    root = os.path.realpath(REPO_MIRROR_DIR)
+    mirror_path = os.path.realpath(os.path.join(root, owner.lower(), f"{repo.lower()}.git"))
+    if os.path.commonpath([root, mirror_path]) != root or mirror_path == root:
+        raise ValueError(f"Mirror path for {owner}/{repo} is outside {REPO_MIRROR_DIR}")
+    return mirror_path
+
+@contextmanager
+def mirror_lock(mirror_path: str, blocking: bool = True):
+    """
+    Holds an exclusive lock on a mirror. The lock is a flock on a sibling file, so it is
+    shared by threads and by every gunicorn worker on the host. Yields False if
+    blocking is False and the lock is held elsewhere.
+    """
+    os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+    with open(f"{mirror_path}.lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _stamp_path(mirror_path: str, name: str) -> str:
+    return os.path.join(mirror_path, name)
+
+def _touch(path: str) -> None:
+    with open(path, "a"):
+        pass
+    os.utime(path, None)
+
+def _seconds_since(path: str) -> float:
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return float("inf")
+
+def _create_mirror(repo_url: str, mirror_path: str) -> None:
+    """Creates a shallow, blob-less bare mirror tracking the remote default branch."""
+    _git("clone", "--bare", "--depth", "1", "--filter=blob:none", "--single-branch", "--no-tags",
+         repo_url, mirror_path)
+    # Bare clones have no fetch refspec; track the default branch so fetches update it
+    head_ref = _git("-C", mirror_path, "symbolic-ref", "HEAD").stdout.decode().strip()
+    _git("-C", mirror_path, "config", "remote.origin.fetch", f"+{head_ref}:{head_ref}")
+
+def _refresh_mirror(repo_url: str, mirror_path: str) -> None:
+    """Creates the mirror or fetches new objects into it. Must be called with the mirror locked."""
+    fetched_stamp = _stamp_path(mirror_path, "last_fetch")
+    if not os.path.isdir(mirror_path):
+        try:
+            _create_mirror(repo_url, mirror_path)
+        except subprocess.CalledProcessError:
+            shutil.rmtree(mirror_path, ignore_errors=True)
+            raise
+    elif _seconds_since(fetched_stamp) >= REPO_MIRROR_FETCH_INTERVAL:
+        _git("-C", mirror_path, "fetch", "--depth", "1", "--prune", "origin")
+    else:
+        # Another request refreshed the mirror moments ago
+        return
+    _touch(fetched_stamp)
+
+def checkout_worktree(owner: str, repo: str, repo_url: str,
+                      sparse_patterns: Optional[List[str]] = None) -> str:
+    """
+    Refreshes the mirror for owner/repo and checks out its HEAD into a new temporary
+    worktree. Only the blobs the checkout needs and the mirror lacks are downloaded.
+    Release the worktree with release_worktree.
+    """
+    mirror_path = get_mirror_path(owner, repo)
+    worktree_path = tempfile.mkdtemp()
+
+    with mirror_lock(mirror_path):
+        try:
+            _refresh_mirror(repo_url, mirror_path)
+            _touch(_stamp_path(mirror_path, "last_used"))
+            _git("-C", mirror_path, "worktree", "add", "--detach", "--no-checkout", worktree_path, "HEAD")
+            if sparse_patterns:
+                _git("-C", worktree_path, "sparse-checkout", "set", "--no-cone", *sparse_patterns)
+            _git("-C", worktree_path, "checkout")
+        except subprocess.CalledProcessError:
+            _remove_worktree(mirror_path, worktree_path)
+            raise
+
+    with _worktrees_lock:
+        _worktrees[worktree_path] = mirror_path
+
+    evict_mirrors(keep=mirror_path)
+    return worktree_path
+
+def _remove_worktree(mirror_path: str, worktree_path: str) -> None:
+    try:
+        _git("-C", mirror_path, "worktree", "remove", "--force", worktree_path)
+    except subprocess.CalledProcessError:
+        pass
+    shutil.rmtree(worktree_path, ignore_errors=True)
+    try:
+        _git("-C", mirror_path, "worktree", "prune")
+    except subprocess.CalledProcessError:
+        pass
+
+def release_worktree(worktree_path: str) -> None:
+    """Removes a worktree created by checkout_worktree."""
+    with _worktrees_lock:
+        mirror_path = _worktrees.pop(worktree_path, None)
+    if mirror_path is None:
+        shutil.rmtree(worktree_path, ignore_errors=True)
+        return
+    with mirror_lock(mirror_path):
+        _remove_worktree(mirror_path, worktree_path)
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for fname in files:
+            try:
+                total += os.lstat(os.path.join(root, fname)).st_size
+            except OSError:
+                pass
+    return total
+
+def list_mirrors() -> List[str]:
+    mirrors = []
+    if not os.path.isdir(REPO_MIRROR_DIR):
+        return mirrors
+    for owner in os.listdir(REPO_MIRROR_DIR):
+        owner_dir = os.path.join(REPO_MIRROR_DIR, owner)
+        if not os.path.isdir(owner_dir):
+            continue
+        for entry in os.listdir(owner_dir):
+            path = os.path.join(owner_dir, entry)
+            if entry.endswith(".git") and os.path.isdir(path):
+                mirrors.append(path)
+    return mirrors
+
+def evict_mirrors(keep: Optional[str] = None) -> None:
+    """
+    Deletes the least recently used mirrors until the total size fits the disk budget.
+    Mirrors that are locked or still have worktrees checked out are never evicted.
+    """
+    budget = REPO_MIRROR_DISK_BUDGET_MB * 1024 * 1024
+    mirrors = [
+        (_seconds_since(_stamp_path(path, "last_used")), _directory_size(path), path)
+        for path in list_mirrors()
+    ]
+    total = sum(size for _, size, _ in mirrors)
+    # Oldest first
+    for _, size, path in sorted(mirrors, reverse=True):
+        if total <= budget:
+            break
+        if path == keep:
+            continue
+        with mirror_lock(path, blocking=False) as locked:
+            if not locked:
+                continue
+            # Drop bookkeeping for worktrees whose directories are already gone
+            try:
+                _git("-C", path, "worktree", "prune")
+            except subprocess.CalledProcessError:
+                pass
+            worktrees_dir = os.path.join(path, "worktrees")
+            if os.path.isdir(worktrees_dir) and os.listdir(worktrees_dir):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,262 @@
+import hashlib
+import os
+import subprocess
+from typing import Dict, Iterator, List, Optional, Tuple
+from utils.language_stats import detect_language, is_vendored_path
+from utils.path_filters import DEFAULT_TRAVERSAL_RULES, GENERATED, VENDORED, PathRules, TraversalRules
+
+# Directories never worth analyzing: VCS metadata, dependencies, caches and build output
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "bower_components", "dist", "build", "coverage",
+    "__pycache__", ".venv", "venv", ".tox", ".nox", ".mypy_cache", ".pytest_cache",
+    ".next", ".nuxt", ".cache", ".idea", ".vscode",
+}
+
+# Extensions that are never text, so their content is not even sniffed
+BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".avif", ".tif", ".tiff", ".psd",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot", ".mp3", ".mp4", ".wav", ".ogg", ".webm", ".mov",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".jar", ".war", ".whl", ".egg",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
+    ".exe", ".dll", ".so", ".dylib", ".a", ".o", ".obj", ".class", ".pyc", ".pyo", ".wasm",
+    ".sqlite", ".sqlite3", ".db", ".bin", ".dat", ".pkl", ".npy", ".npz", ".parquet",
+}
+# Leading bytes checked for NUL when deciding whether a file is binary
+BINARY_SNIFF_BYTES = 8000
+# Bytes read at a time when hashing a file, so hashing never holds a whole file in memory
+HASH_CHUNK_BYTES = 1024 * 1024
+
+class FileEntry:
+    """
+    A file in the repository index. Only metadata is collected by the scan; content is
+    read on first use, up to the limit the caller asks for, and then kept.
+    """
+
+    __slots__ = ("path", "abs_path", "size", "ext", "language", "vendored", "generated", "blob_id",
+                 "_data", "_complete", "_binary")
+
+    def __init__(self, path: str, abs_path: str, size: int,
+                 vendored: Optional[bool] = None, generated: Optional[bool] = None):
+        self.path = path
+        self.abs_path = abs_path
+        self.size = size
+        self.ext = os.path.splitext(path)[1].lower()
+        self.language = detect_language(abs_path, read_shebang=False)
+        # linguist-vendored / linguist-generated from .gitattributes; None when not set
+        self.vendored = vendored
+        self.generated = generated
+        # git's blob id when the checkout matches HEAD, filled in by scan_repository
+        self.blob_id: Optional[str] = None
+        self._data: Optional[bytes] = None
+        self._complete = False
+        self._binary: Optional[bool] = None
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def is_vendored(self) -> bool:
+        """An explicit .gitattributes marker wins over the path heuristics."""
+        return self.vendored if self.vendored is not None else is_vendored_path(self.path)
+
+    def _load(self, limit: Optional[int]) -> Optional[bytes]:
+        """Returns at least the first limit bytes (all of them when limit is None)."""
+        if self._data is not None and (self._complete or (limit is not None and len(self._data) >= limit)):
+            return self._data
+        try:
+            with open(self.abs_path, "rb") as f:
+                data = f.read() if limit is None else f.read(limit)
+        except OSError as e:
+            print(f"Error reading {self.abs_path}: {str(e)}")
+            return None
+        self._data = data
+        self._complete = limit is None or len(data) < limit
+        return data
+
+    def is_binary(self) -> bool:
+        """Detects binary files by extension, or by a NUL byte near the start of the file."""
+        if self._binary is None:
+            if self.ext in BINARY_EXTENSIONS:
+                self._binary = True
+            else:
+                data = self._load(BINARY_SNIFF_BYTES)
+                self._binary = data is None or b"\0" in data[:BINARY_SNIFF_BYTES]
+        return self._binary
+
+    def read(self, max_bytes: Optional[int] = None) -> Optional[str]:
+        """
+        Returns the file's text, cut to at most max_bytes, or None if it is binary
+        or cannot be read as UTF-8.
+        """
+        if self.is_binary():
+            return None
+        data = self._load(max_bytes)
+        if data is None:
+            return None
+        if max_bytes is not None:
+            data = data[:max_bytes]
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # A multi-byte character split by the limit is dropped; anything else is not UTF-8
+            if max_bytes is not None and len(data) == max_bytes and e.start >= len(data) - 3:
+                return data[:e.start].decode("utf-8")
+            return None
+
+    def content_hash(self) -> str:
+        """
+        Returns the file's git blob id, computing it from the content when git did not
+        provide one, so hashes agree whether or not the checkout is a git repository.
+        """
+        if self.blob_id is None:
+            digest = hashlib.sha1()
+            try:
+                with open(self.abs_path, "rb") as f:
+                    remaining = os.fstat(f.fileno()).st_size
+                    digest.update(b"blob %d\0" % remaining)
+                    while remaining > 0:
+                        chunk = f.read(min(HASH_CHUNK_BYTES, remaining))
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        remaining -= len(chunk)
+            except OSError as e:
+                print(f"Error reading {self.abs_path}: {str(e)}")
+                return ""
+            self.blob_id = digest.hexdigest()
+        return self.blob_id
+
+    def is_truncated_at(self, max_bytes: Optional[int]) -> bool:
+        """Returns True if read(max_bytes) leaves part of the file out."""
+        return max_bytes is not None and self.size > max_bytes
+
+class RepoIndex:
+    """In-memory index of a repository, built by a single walk of its tree."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files: List[FileEntry] = []
+        self.by_path: Dict[str, FileEntry] = {}
+        # (relative directory, file names) in walk order, for rendering the tree
+        self.walk_order: List[Tuple[str, List[str]]] = []
+        self.dirs = set()
+
+    def normalize(self, rel_path: str) -> str:
+        """Turns a path from an LLM response or config into an index key ('' is the root)."""
+        if os.path.isabs(rel_path):
+            rel_path = os.path.relpath(rel_path, self.root)
+        rel_path = os.path.normpath(rel_path.strip().strip("/\\"))
+        return "" if rel_path == "." else rel_path
+
+    def get(self, rel_path: str) -> Optional[FileEntry]:
+        return self.by_path.get(self.normalize(rel_path))
+
+    def is_dir(self, rel_path: str) -> bool:
+        return self.normalize(rel_path) in self.dirs
+
+    def files_under(self, rel_dir: str, rules: Optional[TraversalRules] = None) -> Iterator[FileEntry]:
+        """Yields the files inside a directory that the rules allow, recursively, in walk order."""
+        rules = rules or DEFAULT_TRAVERSAL_RULES
+        rel_dir = self.normalize(rel_dir)
+        prefix = rel_dir + os.sep if rel_dir else ""
+        for entry in self.files:
+            if entry.path.startswith(prefix) and rules.allows(entry, rel_dir):
+                yield entry
+
+    def top_level_entries(self) -> List[str]:
+        """Lists the root directory, with a trailing '/' on directory names."""
+        names = [d + "/" for d in sorted(self.dirs) if d and os.sep not in d]
+        names.extend(entry.name for entry in self.files if os.sep not in entry.path)
+        return names
+
+    def tree_lines(self) -> List[str]:
+        """
+        Renders the indexed tree, one line per directory or file, indented by depth. The
+        root is shown as "./" rather than by its name, which for a checkout is a random
+        temporary directory and would keep prompts built from the tree from being cached.
+        """
+        lines = []
+        for rel_dir, file_names in self.walk_order:
+            level = rel_dir.count(os.sep) + 1 if rel_dir else 0
+            lines.append(f"{' ' * 4 * level}{os.path.basename(rel_dir) + '/' if rel_dir else './'}")
+            sub_indent = ' ' * 4 * (level + 1)
+            lines.extend(f"{sub_indent}{name}" for name in file_names)
+        return lines
+
+def load_blob_ids(repo_path: str) -> Dict[str, str]:
+    """Returns git's blob id for every tracked file whose checkout is unchanged from HEAD."""
+    if not os.path.exists(os.path.join(repo_path, ".git")):
+        return {}
+    try:
+        listed = subprocess.run(
+            ["git", "-C", repo_path, "ls-files", "-s", "-z"],
+            capture_output=True, check=True, timeout=60
+        ).stdout
+        changed = subprocess.run(
+            ["git", "-C", repo_path, "diff", "--name-only", "-z", "HEAD"],
+            capture_output=True, check=True, timeout=60
+        ).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Error listing blob ids for {repo_path}: {str(e)}")
+        return {}
+
+    dirty = set(changed.split(b"\0"))
+    blob_ids = {}
+    for record in listed.split(b"\0"):
+        if b"\t" not in record:
+            continue
+        meta, path = record.split(b"\t", 1)
+        mode, blob_id, _ = meta.split()
+        # Skip submodules and files edited since HEAD
+        if mode == b"160000" or path in dirty:
+            continue
+        blob_ids[path.decode("utf-8", "surrogateescape").replace("/", os.sep)] = blob_id.decode("ascii")
+    return blob_ids
+
+def scan_repository(repo_path: str) -> RepoIndex:
+    """
+    Walks the repository once. Ignored directories, paths matched by .gitignore and
+    subtrees marked vendored or generated in .gitattributes are pruned before the walk
+    descends into them; other linguist markers are recorded on each file.
+    """
+    index = RepoIndex(repo_path)
+    index.dirs.add("")
+    rules_by_dir = {"": PathRules.for_repository(repo_path)}
+    for root, dirs, files in os.walk(repo_path):
+        rel_dir = os.path.relpath(root, repo_path)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        rules = rules_by_dir.pop(rel_dir).for_directory(rel_dir, root, files)
+
+        kept_dirs = []
+        for d in sorted(dirs):
+            rel_path = os.path.join(rel_dir, d)
+            if d in IGNORED_DIRS or rules.is_ignored(rel_path, True) or rules.marks_subtree(rel_path):
+                continue
+            kept_dirs.append(d)
+            index.dirs.add(rel_path)
+            rules_by_dir[rel_path] = rules
+        dirs[:] = kept_dirs
+
+        kept_files = []
+        for fname in sorted(files):
+            rel_path = os.path.join(rel_dir, fname)
+            if rules.is_ignored(rel_path, False):
+                continue
+            abs_path = os.path.join(root, fname)
+            try:
+                size = os.lstat(abs_path).st_size
+            except OSError:
+                continue
+            attributes = rules.file_attributes(rel_path)
+            entry = FileEntry(rel_path, abs_path, size, attributes.get(VENDORED), attributes.get(GENERATED))
+            kept_files.append(fname)
+            index.files.append(entry)
+            index.by_path[entry.path] = entry
+        index.walk_order.append((rel_dir, kept_files))
+
+    for path, blob_id in load_blob_ids(repo_path).items():
+        entry = index.by_path.get(path)
+        if entry is not None:
+            entry.blob_id = blob_id
+    return index